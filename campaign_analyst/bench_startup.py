@@ -0,0 +1,71 @@
+"""
+Benchmark du temps de démarrage du service Analyst, sans accès réseau.
+
+Chaque mesure lance un interpréteur neuf qui importe le service puis exécute
+le démarrage de l'application Quart, avec toute connexion sortante bloquée.
+Le script échoue si la médiane dépasse la cible.
+
+Usage :
+    python bench_startup.py [--runs 5] [--target-ms 2000]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import socket, time, json
+
+def _blocked(*args, **kwargs):
+    raise OSError("Réseau désactivé pour le benchmark")
+
+socket.socket.connect = _blocked
+socket.create_connection = _blocked
+
+start = time.perf_counter()
+import campaign_analyst
+import asyncio
+asyncio.run(campaign_analyst.app.startup())
+elapsed = time.perf_counter() - start
+asyncio.run(campaign_analyst.app.shutdown())
+print(json.dumps({"startup_ms": elapsed * 1000}))
+"""
+
+
+def measure_once(service_dir):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env.setdefault("YOUTUBE_API_KEY", "bench")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=service_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Échec du démarrage sans réseau :\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])["startup_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=float(os.getenv("STARTUP_TARGET_MS", "2000")))
+    args = parser.parse_args()
+
+    service_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = [measure_once(service_dir) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(f"Démarrage : médiane {median:.0f} ms, min {min(samples):.0f} ms, max {max(samples):.0f} ms "
+          f"({args.runs} essais, cible {args.target_ms:.0f} ms)")
+    if median > args.target_ms:
+        print("Cible de démarrage dépassée")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
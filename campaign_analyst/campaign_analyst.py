@@ -4,11 +4,16 @@ import os
 from dotenv import load_dotenv
 import logging
 import musicbrainzngs
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import aiohttp
 import asyncio
 from cachetools import TTLCache
+import json
+from json_stream import IncrementalJSONParser, parse_json_response
+from youtube_quota import YouTubeQuotaClient, QuotaExceededError
+from genre_classifier import GenreClassifier
+from model_router import ModelRouter, DEFAULT_TASKS
+import time
 
 app = Quart(__name__)
 
@@ -30,19 +35,66 @@ if not youtube_api_key:
     raise ValueError("YOUTUBE_API_KEY manquant")
 
 # Initialisation des clients
+# Les clients réseau (YouTube, OpenAI) sont construits au premier usage pour
+# que le service démarre vite et sans dépendre de la disponibilité de Google.
 # MusicBrainz
 musicbrainzngs.set_useragent("music-analyzer", "1.0", "your-email@example.com")
 
-# YouTube
-youtube = build('youtube', 'v3', developerKey=youtube_api_key)
+# YouTube, avec suivi du quota quotidien
+# Le quota du projet Google (10 000 unités/jour) est partagé entre l'Analyst et
+# l'Optimizer : par défaut 7000 unités pour ce service, 3000 pour l'Optimizer.
+# Le décompte est commun aux workers et aux redémarrages via YOUTUBE_QUOTA_DB ; si
+# les deux services montent le même fichier, donner à chacun YOUTUBE_DAILY_QUOTA=10000.
+youtube_client = YouTubeQuotaClient(
+    youtube_api_key,
+    daily_quota=int(os.getenv("YOUTUBE_DAILY_QUOTA", "7000")),
+    reserve=int(os.getenv("YOUTUBE_QUOTA_RESERVE", "500")),
+    ledger_path=os.getenv("YOUTUBE_QUOTA_DB", "data/youtube_quota.db") or None
+)
+
+# OpenAI
+_openai_client = None
+
+def get_openai_client():
+    """Renvoie le client OpenAI partagé, créé au premier appel."""
+    global _openai_client
+    if _openai_client is None:
+        # OPENAI_BASE_URL permet de cibler un serveur compatible local (voir openai_stub.py)
+        _openai_client = openai.AsyncOpenAI(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+    return _openai_client
+
+# Routage des modèles selon les SLO de latence et de coût
+style_refinement_slo = dict(DEFAULT_TASKS["style_refinement"])
+style_refinement_slo["tiers"] = os.getenv("STYLE_REFINEMENT_MODELS", "gpt-4o,gpt-4o-mini").split(",")
+style_refinement_slo["p95_budget_ms"] = float(os.getenv("STYLE_REFINEMENT_P95_MS", style_refinement_slo["p95_budget_ms"]))
+style_refinement_slo["max_cost_per_call"] = float(os.getenv("STYLE_REFINEMENT_MAX_COST", style_refinement_slo["max_cost_per_call"]))
+model_router = ModelRouter(
+    tasks={"style_refinement": style_refinement_slo},
+    max_age=float(os.getenv("MODEL_ROUTER_MAX_AGE", "300"))
+)
+
+# Classification locale des tags, tentée avant OpenAI
+genre_classifier = GenreClassifier(threshold=float(os.getenv("GENRE_CLASSIFIER_THRESHOLD", "0.6")))
 
 # Cache avec TTL de 24h
 cache = TTLCache(maxsize=100, ttl=86400)
 
+# Délai maximum accordé à chaque source d'enrichissement, en secondes
+SOURCE_DEADLINES = {
+    "musicbrainz": float(os.getenv("MUSICBRAINZ_DEADLINE", "2.0")),
+    "youtube": float(os.getenv("YOUTUBE_DEADLINE", "2.0"))
+}
+
+# Résultats des sources, alimentés aussi par les appels terminés après leur délai
+source_cache = TTLCache(maxsize=1000, ttl=86400)
+
+# Appels ayant dépassé leur délai, conservés jusqu'à leur fin pour réchauffer le cache
+_background_fetches = set()
+
 async def fetch_musicbrainz_data(artist):
     """Récupère des données sur l'artiste via MusicBrainz."""
     try:
-        result = musicbrainzngs.search_artists(artist=artist, limit=1)
+        result = await asyncio.to_thread(musicbrainzngs.search_artists, artist=artist, limit=1)
         artists = result.get("artist-list", [])
         if not artists:
             logger.warning(f"Aucune donnée MusicBrainz trouvée pour {artist}")
@@ -60,39 +112,24 @@ async def fetch_youtube_data(artist, song):
     """Récupère des données via YouTube (par exemple, popularité ou tendances)."""
     try:
         search_query = f"{artist} {song} official"
-        request = youtube.search().list(
-            part="snippet",
-            q=search_query,
-            type="video",
-            maxResults=1,
-            order="relevance"
-        )
-        response = request.execute()
-        items = response.get("items", [])
+        items = await asyncio.to_thread(youtube_client.search, search_query, 1)
         if not items:
             logger.warning(f"Aucune vidéo YouTube trouvée pour {artist} - {song}")
             return None
 
-        video = items[0]
-        video_id = video["id"]["videoId"]
-        video_request = youtube.videos().list(
-            part="statistics",
-            id=video_id
-        )
-        video_response = video_request.execute()
-        stats = video_response.get("items", [{}])[0].get("statistics", {})
+        video_id = items[0]["id"]["videoId"]
+        statistics = await asyncio.to_thread(youtube_client.video_statistics, [video_id])
+        stats = statistics.get(video_id, {})
         view_count = int(stats.get("viewCount", 0))
         return view_count
 
-    except HttpError as e:
+    except (HttpError, QuotaExceededError) as e:
         logger.error(f"Erreur lors de la recherche YouTube : {str(e)}")
         return None
 
-async def analyze_with_openai(artist, song, genres, additional_data):
-    """Analyse les données avec OpenAI pour affiner les styles."""
-    try:
-        client = openai.OpenAI(api_key=openai_api_key)  # Initialisation sans proxies
-        prompt = f"""
+def build_analysis_prompt(artist, song, genres, additional_data):
+    """Construit le prompt d'affinage des styles."""
+    return f"""
         Tu es un analyste musical expert. Analyse les données suivantes pour affiner les styles musicaux de l'artiste et fournir une analyse concise.
 
         Artiste : {artist}
@@ -112,93 +149,264 @@ async def analyze_with_openai(artist, song, genres, additional_data):
           "explanation": "Explication concise."
         }}
         """
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Tu es un analyste musical."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=200,
-            temperature=0.7
-        )
-        result = response.choices[0].message.content
-
-        result_cleaned = result.strip().replace("```json\n", "").replace("\n```", "")
-        try:
-            result_json = eval(result_cleaned)
-            return result_json.get("styles", genres), result_json.get("explanation", "Analyse basée sur les données fournies.")
-        except Exception as e:
-            logger.error(f"Erreur lors du parsing de la réponse OpenAI : {str(e)}")
-            return genres, "Erreur lors de l'analyse OpenAI."
 
+async def stream_openai_analysis(model, artist, song, genres, additional_data):
+    """Interroge OpenAI en streaming et émet chaque champ JSON dès que sa valeur est complète."""
+    client = get_openai_client()
+    stream = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": "Tu es un analyste musical."},
+            {"role": "user", "content": build_analysis_prompt(artist, song, genres, additional_data)}
+        ],
+        max_tokens=200,
+        temperature=0.7,
+        stream=True
+    )
+    parser = IncrementalJSONParser()
+    # Le flux est fermé dès la fin de l'objet JSON, sans attendre la fin de la réponse HTTP
+    async with stream:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for key, value in parser.feed(delta):
+                yield key, value
+            if parser.done:
+                break
+
+    # Réponse tronquée ou mal formée : dernière tentative sur le texte complet
+    if not parser.done and "styles" not in parser.result:
+        for key, value in parse_json_response(parser.text).items():
+            yield key, value
+
+async def analyze_with_openai(artist, song, genres, additional_data, on_styles=None):
+    """
+    Analyse les données avec OpenAI pour affiner les styles.
+
+    Si `on_styles` est fourni, il est appelé avec les styles affinés dès que
+    le tableau `styles` est complet dans le flux, avant la fin de la génération.
+    """
+    styles = genres
+    explanation = "Analyse basée sur les données fournies."
+    model = model_router.choose("style_refinement")
+    parsed = False
+    completed = False
+    start = time.perf_counter()
+    try:
+        async for key, value in stream_openai_analysis(model, artist, song, genres, additional_data):
+            if key == "styles" and isinstance(value, list) and value:
+                styles = value
+                parsed = True
+                if on_styles is not None:
+                    await on_styles(styles)
+            elif key == "explanation" and isinstance(value, str):
+                explanation = value
+        completed = True
+        return styles, explanation
+
+    except ValueError as e:
+        logger.error(f"Erreur lors du parsing de la réponse OpenAI : {str(e)}")
+        return styles, "Erreur lors de l'analyse OpenAI."
     except openai.APIError as e:
         logger.error(f"Erreur OpenAI : {str(e)}")
-        return genres, "Erreur lors de l'analyse OpenAI."
+        return styles, "Erreur lors de l'analyse OpenAI."
     except Exception as e:
         logger.error(f"Erreur inattendue lors de l'analyse OpenAI : {str(e)}")
-        return genres, "Erreur lors de l'analyse OpenAI."
+        return styles, "Erreur lors de l'analyse OpenAI."
+    finally:
+        model_router.record(model, time.perf_counter() - start, parsed, completed)
+
+async def _fetch_and_store(source, key, coro):
+    result = await coro
+    if result:
+        source_cache[(source, key)] = result
+    return result
+
+async def _await_source(source, task):
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), SOURCE_DEADLINES[source])
+    except asyncio.TimeoutError:
+        logger.warning(f"Source {source} hors délai ({SOURCE_DEADLINES[source]}s), analyse poursuivie sans elle")
+        _background_fetches.add(task)
+        task.add_done_callback(_background_fetches.discard)
+        return None
+    except Exception as e:
+        logger.error(f"Erreur lors de la récupération de la source {source} : {str(e)}")
+        return None
+
+async def fetch_sources(fetchers):
+    """
+    Interroge les sources d'enrichissement en parallèle, chacune dans son délai.
+
+    Args:
+        fetchers (dict): source -> (clé de cache, coroutine de récupération)
+
+    Returns:
+        tuple: (résultats par source, liste des sources ignorées)
+    """
+    results = {}
+    pending = {}
+    for source, (key, coro) in fetchers.items():
+        cached = source_cache.get((source, key))
+        if cached is not None:
+            coro.close()
+            results[source] = cached
+        else:
+            pending[source] = asyncio.ensure_future(_fetch_and_store(source, key, coro))
+
+    outcomes = await asyncio.gather(*(_await_source(source, task) for source, task in pending.items()))
+    skipped = []
+    for (source, task), outcome in zip(pending.items(), outcomes):
+        if task.done():
+            results[source] = outcome
+        else:
+            skipped.append(source)
+    return results, skipped
+
+def parse_analysis_request(data):
+    """Valide le corps de la requête et renvoie (artist, song, genres)."""
+    if not data:
+        raise ValueError("Aucune donnée fournie")
+
+    # Validation des champs obligatoires
+    required_fields = ['artist', 'song', 'genres']
+    missing_fields = [field for field in required_fields if not data.get(field)]
+    if missing_fields:
+        raise ValueError(f"Champs manquants : {missing_fields}")
+
+    artist = data.get('artist')
+    song = data.get('song')
+    genres = data.get('genres') if isinstance(data.get('genres'), list) else [data.get('genres')]
+    return artist, song, genres
+
+async def run_analysis(artist, song, genres, on_styles=None):
+    """Exécute l'analyse complète (cache, enrichissement, OpenAI) pour un artiste."""
+    # Clé de cache
+    cache_key = f"{artist}_{song}_{'_'.join(genres)}"
+    if cache_key in cache:
+        logger.info(f"Réponse trouvée dans le cache pour : {cache_key}")
+        return cache[cache_key]
+
+    # Récupérer des données supplémentaires, chaque source dans son délai
+    sources, skipped_sources = await fetch_sources({
+        "musicbrainz": (artist, fetch_musicbrainz_data(artist)),
+        "youtube": (f"{artist}_{song}", fetch_youtube_data(artist, song))
+    })
+    musicbrainz_tags = sources.get("musicbrainz") or []
+    youtube_views = sources.get("youtube")
+
+    # Combiner les données pour l'analyse
+    additional_data = {
+        "musicbrainz_tags": musicbrainz_tags,
+        "youtube_views": youtube_views
+    }
+
+    # Chemin rapide : classification locale des tags, OpenAI seulement pour les cas ambigus
+    classification = genre_classifier.classify(musicbrainz_tags, genres)
+    if classification["confident"]:
+        refined_styles = classification["styles"]
+        explanation = f"Styles déduits des tags MusicBrainz : {', '.join(musicbrainz_tags[:5])}."
+        logger.info(f"Styles classés localement pour {artist} : {refined_styles} (score {classification['confidence']:.2f})")
+        if on_styles is not None:
+            await on_styles(refined_styles)
+    else:
+        # Analyser avec OpenAI pour affiner les styles
+        refined_styles, explanation = await analyze_with_openai(artist, song, genres, additional_data, on_styles=on_styles)
+
+    # Construire la réponse
+    analysis_data = {
+        "artist": artist,
+        "song": song,
+        "styles": refined_styles,
+        "artist_image_url": f"https://example.com/{artist.lower().replace(' ', '-')}.jpg",
+        "lookalike_artists": [],
+        "trends": [],
+        "analysis_explanation": explanation,
+        "skipped_sources": skipped_sources,
+        "analyzed_at": time.time()
+    }
+
+    # Une analyse partielle n'est pas mise en cache : la suivante profitera des sources réchauffées
+    if skipped_sources:
+        logger.info(f"Analyse partielle pour {cache_key}, sources ignorées : {skipped_sources}")
+        return analysis_data
+
+    # Mettre en cache
+    cache[cache_key] = analysis_data
+    logger.info(f"Analyse générée et mise en cache pour : {cache_key}")
+    return analysis_data
 
 @app.route('/analyze', methods=['POST'])
 async def analyze():
     try:
         data = await request.get_json()
-        if not data:
-            logger.error("Aucune donnée JSON fournie")
-            return jsonify({"error": "Aucune donnée fournie"}), 400
-
-        # Validation des champs obligatoires
-        required_fields = ['artist', 'song', 'genres']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        if missing_fields:
-            logger.error(f"Champs manquants : {missing_fields}")
-            return jsonify({"error": f"Champs manquants : {missing_fields}"}), 400
-
-        artist = data.get('artist')
-        song = data.get('song')
-        genres = data.get('genres') if isinstance(data.get('genres'), list) else [data.get('genres')]
-
-        # Clé de cache
-        cache_key = f"{artist}_{song}_{'_'.join(genres)}"
-        if cache_key in cache:
-            logger.info(f"Réponse trouvée dans le cache pour : {cache_key}")
-            return jsonify(cache[cache_key])
-
-        # Récupérer des données supplémentaires
-        tasks = [
-            fetch_musicbrainz_data(artist),
-            fetch_youtube_data(artist, song)
-        ]
-        musicbrainz_tags, youtube_views = await asyncio.gather(*tasks)
-
-        # Combiner les données pour l'analyse
-        additional_data = {
-            "musicbrainz_tags": musicbrainz_tags,
-            "youtube_views": youtube_views
-        }
-
-        # Analyser avec OpenAI pour affiner les styles
-        refined_styles, explanation = await analyze_with_openai(artist, song, genres, additional_data)
-
-        # Construire la réponse
-        analysis_data = {
-            "artist": artist,
-            "song": song,
-            "styles": refined_styles,
-            "artist_image_url": f"https://example.com/{artist.lower().replace(' ', '-')}.jpg",
-            "lookalike_artists": [],
-            "trends": [],
-            "analysis_explanation": explanation
-        }
-
-        # Mettre en cache
-        cache[cache_key] = analysis_data
-        logger.info(f"Analyse générée et mise en cache pour : {cache_key}")
+        try:
+            artist, song, genres = parse_analysis_request(data)
+        except ValueError as e:
+            logger.error(str(e))
+            return jsonify({"error": str(e)}), 400
 
+        analysis_data = await run_analysis(artist, song, genres)
         return jsonify(analysis_data), 200
 
     except Exception as e:
         logger.error(f"Erreur inattendue : {str(e)}")
         return jsonify({"error": f"Erreur interne : {str(e)}"}), 500
 
+@app.route('/analyze/stream', methods=['POST'])
+async def analyze_stream():
+    """
+    Variante en streaming de /analyze (NDJSON).
+
+    Émet une ligne {"event": "styles"} dès que les styles affinés sont connus,
+    puis une ligne {"event": "analysis"} contenant l'analyse complète.
+    """
+    data = await request.get_json()
+    try:
+        artist, song, genres = parse_analysis_request(data)
+    except ValueError as e:
+        logger.error(str(e))
+        return jsonify({"error": str(e)}), 400
+
+    queue = asyncio.Queue()
+
+    async def on_styles(styles):
+        await queue.put({"event": "styles", "styles": styles})
+
+    async def produce():
+        try:
+            analysis_data = await run_analysis(artist, song, genres, on_styles=on_styles)
+            await queue.put({"event": "analysis", "analysis": analysis_data})
+        except Exception as e:
+            logger.error(f"Erreur inattendue : {str(e)}")
+            await queue.put({"event": "error", "error": f"Erreur interne : {str(e)}"})
+        finally:
+            await queue.put(None)
+
+    producer = asyncio.ensure_future(produce())
+
+    async def generate():
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            await producer
+
+    return generate(), 200, {"Content-Type": "application/x-ndjson"}
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    return jsonify({
+        "youtube_quota": youtube_client.snapshot(),
+        "genre_classifier": genre_classifier.metrics(),
+        "models": model_router.metrics()
+    })
+
 if __name__ == '__main__':
     app.run(debug=False, host='0.0.0.0', port=8080)
@@ -0,0 +1,146 @@
+import logging
+import re
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Styles canoniques et tags MusicBrainz représentatifs, avec leur poids
+STYLE_CENTROIDS = {
+    "symphonic metal": {"symphonic metal": 1.0, "gothic metal": 0.5, "power metal": 0.4, "operatic": 0.4, "female fronted metal": 0.4, "metal": 0.3},
+    "industrial metal": {"industrial metal": 1.0, "industrial": 0.8, "neue deutsche harte": 0.9, "industrial rock": 0.6, "metal": 0.3},
+    "gothic metal": {"gothic metal": 1.0, "gothic": 0.7, "doom metal": 0.5, "gothic rock": 0.5, "metal": 0.3},
+    "metal": {"metal": 1.0, "heavy metal": 0.9, "thrash metal": 0.7, "death metal": 0.6, "progressive metal": 0.6, "hard rock": 0.3},
+    "rock": {"rock": 1.0, "alternative rock": 0.7, "hard rock": 0.6, "classic rock": 0.6, "indie rock": 0.5, "pop rock": 0.4},
+    "punk": {"punk": 1.0, "punk rock": 1.0, "pop punk": 0.8, "hardcore punk": 0.7, "skate punk": 0.6},
+    "grunge": {"grunge": 1.0, "post grunge": 0.6, "seattle": 0.6, "alternative rock": 0.5},
+    "pop": {"pop": 1.0, "dance pop": 0.7, "synthpop": 0.5, "electropop": 0.5, "pop rock": 0.4},
+    "hip hop": {"hip hop": 1.0, "rap": 1.0, "trap": 0.6, "french hip hop": 0.7, "gangsta rap": 0.6},
+    "electronic": {"electronic": 1.0, "electro": 0.8, "edm": 0.8, "house": 0.7, "techno": 0.7, "dance": 0.5},
+    "chanson francaise": {"chanson francaise": 1.0, "chanson": 0.9, "variete francaise": 0.9, "french pop": 0.6, "french": 0.5},
+    "r&b": {"r&b": 1.0, "rnb": 1.0, "contemporary r&b": 0.9, "soul": 0.6, "neo soul": 0.6},
+    "reggae": {"reggae": 1.0, "dancehall": 0.7, "roots reggae": 0.8, "ska": 0.5, "dub": 0.5},
+    "jazz": {"jazz": 1.0, "bebop": 0.7, "jazz fusion": 0.7, "swing": 0.6, "blues": 0.4},
+    "classical": {"classical": 1.0, "orchestral": 0.8, "baroque": 0.7, "romantic": 0.5, "opera": 0.6}
+}
+
+# Poids des mots isolés par rapport au tag complet, pour les tags inconnus ("melodic death metal")
+TOKEN_WEIGHT = 0.5
+# Poids des genres fournis par l'utilisateur par rapport aux tags MusicBrainz
+INITIAL_GENRE_WEIGHT = 0.5
+
+_ACCENTS = str.maketrans("àâäéèêëîïôöùûüç", "aaaeeeeiioouuuc")
+
+
+def normalize_tag(tag):
+    """Normalise un tag : minuscules, sans accents, tirets remplacés par des espaces."""
+    tag = tag.lower().translate(_ACCENTS)
+    return re.sub(r"[\s\-_/]+", " ", tag).strip()
+
+
+def _features(weighted_tags):
+    """Décompose des tags pondérés en caractéristiques (tag complet et mots isolés)."""
+    features = {}
+    for tag, weight in weighted_tags:
+        tag = normalize_tag(tag)
+        if not tag:
+            continue
+        features["t:" + tag] = features.get("t:" + tag, 0.0) + weight
+        for token in tag.split():
+            features["w:" + token] = features.get("w:" + token, 0.0) + weight * TOKEN_WEIGHT
+    return features
+
+
+class GenreClassifier:
+    """
+    Classification locale des tags MusicBrainz en styles canoniques.
+
+    Les tags sont convertis en vecteurs et comparés aux centroïdes des styles
+    par similarité cosinus. Seuls les cas dont le meilleur score dépasse le
+    seuil de confiance sont résolus localement ; les autres sont laissés à OpenAI.
+    """
+
+    def __init__(self, threshold=0.6, min_tags=2, relative_cutoff=0.75, max_styles=3):
+        """
+        Args:
+            threshold (float): Score cosinus minimal du meilleur style pour répondre localement
+            min_tags (int): Nombre minimal de tags MusicBrainz pour tenter la classification
+            relative_cutoff (float): Fraction du meilleur score requise pour retenir un style secondaire
+            max_styles (int): Nombre maximum de styles renvoyés
+        """
+        self.threshold = threshold
+        self.min_tags = min_tags
+        self.relative_cutoff = relative_cutoff
+        self.max_styles = max_styles
+        self.styles = list(STYLE_CENTROIDS)
+
+        centroid_features = [_features(tags.items()) for tags in STYLE_CENTROIDS.values()]
+        vocabulary = sorted({feature for features in centroid_features for feature in features})
+        self._index = {feature: i for i, feature in enumerate(vocabulary)}
+        self._centroids = self._matrix(centroid_features)
+
+        self._lock = threading.Lock()
+        self._counters = {"fast_path": 0, "ambiguous": 0, "insufficient_tags": 0}
+
+    def _matrix(self, feature_dicts):
+        """Construit une matrice de vecteurs normalisés (une ligne par entrée)."""
+        matrix = np.zeros((len(feature_dicts), len(self._index)), dtype=np.float32)
+        for row, features in enumerate(feature_dicts):
+            for feature, weight in features.items():
+                column = self._index.get(feature)
+                if column is not None:
+                    matrix[row, column] = weight
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def scores(self, tag_lists, initial_genres=None):
+        """
+        Calcule les scores de similarité pour plusieurs listes de tags en une passe.
+
+        Returns:
+            numpy.ndarray: Matrice (nombre d'entrées x nombre de styles)
+        """
+        initial_genres = initial_genres or [[] for _ in tag_lists]
+        feature_dicts = [
+            _features([(tag, 1.0) for tag in tags] + [(genre, INITIAL_GENRE_WEIGHT) for genre in genres])
+            for tags, genres in zip(tag_lists, initial_genres)
+        ]
+        return self._matrix(feature_dicts) @ self._centroids.T
+
+    def classify(self, tags, initial_genres=None):
+        """
+        Classe un artiste à partir de ses tags MusicBrainz.
+
+        Returns:
+            dict: {"confident": bool, "styles": list, "confidence": float}
+        """
+        if len(tags) < self.min_tags:
+            self._count("insufficient_tags")
+            return {"confident": False, "styles": [], "confidence": 0.0}
+
+        row = self.scores([tags], [initial_genres or []])[0]
+        ranking = np.argsort(row)[::-1]
+        best = float(row[ranking[0]])
+        if best < self.threshold:
+            self._count("ambiguous")
+            return {"confident": False, "styles": [], "confidence": best}
+
+        styles = [self.styles[i] for i in ranking[:self.max_styles] if row[i] >= best * self.relative_cutoff]
+        self._count("fast_path")
+        return {"confident": True, "styles": styles, "confidence": best}
+
+    def _count(self, outcome):
+        with self._lock:
+            self._counters[outcome] += 1
+
+    def metrics(self):
+        """Renvoie les compteurs d'utilisation du chemin rapide."""
+        with self._lock:
+            counters = dict(self._counters)
+        total = sum(counters.values())
+        return {
+            **counters,
+            "total": total,
+            "threshold": self.threshold,
+            "fast_path_ratio": round(counters["fast_path"] / total, 3) if total else 0.0
+        }
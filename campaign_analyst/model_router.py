@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Modèles disponibles et coût indicatif (USD pour 1000 tokens, entrée et sortie confondues)
+DEFAULT_MODELS = {
+    "gpt-4o": {"cost_per_1k_tokens": 0.01},
+    "gpt-4o-mini": {"cost_per_1k_tokens": 0.0006}
+}
+
+# SLO par tâche ; les niveaux vont du plus précis au plus rapide
+DEFAULT_TASKS = {
+    "style_refinement": {
+        "tiers": ["gpt-4o", "gpt-4o-mini"],
+        "p95_budget_ms": 4000,
+        "max_cost_per_call": 0.01,
+        "estimated_tokens": 600
+    }
+}
+
+
+class ModelRouter:
+    """
+    Choix du modèle OpenAI par tâche selon des SLO de latence et de coût.
+
+    La latence et le taux de réponses exploitables sont mesurés par modèle sur
+    une fenêtre glissante, bornée en nombre de mesures et en âge. Quand le p95
+    du modèle principal dépasse le budget de la tâche, le niveau suivant, plus
+    rapide, est utilisé. Les mesures anciennes expirent : pendant un repli, le
+    p95 du modèle principal ne repose que sur les appels de contrôle récents.
+    Seuls les appels terminés fournissent une mesure de latence.
+    """
+
+    def __init__(self, models=None, tasks=None, window=100, min_samples=10, probe_every=20, max_age=300):
+        """
+        Args:
+            models (dict): Modèles disponibles et leur coût
+            tasks (dict): SLO par tâche (niveaux, budget p95 en ms, coût maximum par appel)
+            window (int): Nombre de mesures conservées par modèle
+            min_samples (int): Mesures nécessaires avant de juger le p95 d'un modèle
+            probe_every (int): Fréquence des appels de contrôle vers le modèle principal pendant un repli
+            max_age (float): Âge maximum d'une mesure de latence, en secondes
+        """
+        self.models = models or DEFAULT_MODELS
+        self.tasks = tasks or DEFAULT_TASKS
+        self.window = window
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self.max_age = max_age
+        self._fallbacks = {}
+        self._lock = threading.Lock()
+        self._latencies = {model: deque(maxlen=window) for model in self.models}
+        self._calls = {model: 0 for model in self.models}
+        self._parse_failures = {model: 0 for model in self.models}
+
+    def _samples(self, model):
+        """Latences récentes d'un modèle, après suppression des mesures trop anciennes."""
+        samples = self._latencies.get(model)
+        if not samples:
+            return []
+        cutoff = time.monotonic() - self.max_age
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        return [latency for _, latency in samples]
+
+    def _p95_ms(self, model):
+        samples = self._samples(model)
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, 95)) * 1000
+
+    def _estimated_cost(self, model, task):
+        # Un modèle sans coût configuré est considéré comme abordable
+        cost_per_1k_tokens = self.models.get(model, {}).get("cost_per_1k_tokens", 0.0)
+        return cost_per_1k_tokens * task["estimated_tokens"] / 1000
+
+    def choose(self, task_name):
+        """
+        Renvoie le modèle à utiliser pour une tâche.
+
+        Le premier niveau qui respecte le coût maximum et dont le p95 mesuré
+        tient dans le budget est retenu. Si aucun ne tient le budget, le plus
+        rapide des niveaux abordables est utilisé.
+        """
+        task = self.tasks[task_name]
+        affordable = [model for model in task["tiers"] if self._estimated_cost(model, task) <= task["max_cost_per_call"]]
+        if not affordable:
+            return task["tiers"][-1]
+
+        with self._lock:
+            p95s = {model: self._p95_ms(model) for model in affordable}
+            within_budget = [model for model in affordable if p95s[model] is None or p95s[model] <= task["p95_budget_ms"]]
+            if within_budget and within_budget[0] == affordable[0]:
+                self._fallbacks[task_name] = 0
+                return affordable[0]
+
+            # Pendant un repli, un appel de contrôle régulier renouvelle les mesures du modèle principal
+            self._fallbacks[task_name] = self._fallbacks.get(task_name, 0) + 1
+            if self._fallbacks[task_name] % self.probe_every == 0:
+                return affordable[0]
+
+        if within_budget:
+            logger.info(f"Tâche {task_name} routée vers {within_budget[0]} (p95 des niveaux précédents hors budget)")
+            return within_budget[0]
+
+        fastest = min(affordable, key=lambda model: p95s[model])
+        logger.warning(f"Aucun modèle ne respecte le budget de {task['p95_budget_ms']} ms pour {task_name}, utilisation de {fastest}")
+        return fastest
+
+    def record(self, model, latency, parsed, completed=True):
+        """
+        Enregistre le résultat d'un appel.
+
+        Args:
+            model (str): Modèle appelé
+            latency (float): Durée de l'appel en secondes
+            parsed (bool): True si la réponse a pu être exploitée
+            completed (bool): False si l'appel a échoué avant la fin de la réponse ;
+                              sa durée n'est alors pas comptée dans la latence
+        """
+        with self._lock:
+            if model not in self._latencies:
+                self._latencies[model] = deque(maxlen=self.window)
+                self._calls[model] = 0
+                self._parse_failures[model] = 0
+            if completed:
+                self._latencies[model].append((time.monotonic(), latency))
+            self._calls[model] += 1
+            if not parsed:
+                self._parse_failures[model] += 1
+
+    def metrics(self):
+        """Renvoie la latence et le taux de parsing réussi par modèle."""
+        with self._lock:
+            result = {}
+            for model in self._latencies:
+                samples = self._samples(model)
+                calls = self._calls[model]
+                result[model] = {
+                    "calls": calls,
+                    "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 1) if samples else None,
+                    "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 1) if samples else None,
+                    "parse_success_rate": round(1 - self._parse_failures[model] / calls, 3) if calls else None
+                }
+            return result
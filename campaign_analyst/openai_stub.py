@@ -0,0 +1,79 @@
+"""
+Serveur local compatible avec l'API OpenAI (chat completions), pour les essais.
+
+Répond à POST /v1/chat/completions, en streaming ou non, avec une analyse
+de styles fixe et une latence configurable par modèle :
+
+    STUB_LATENCY_MS="gpt-4o=1500,gpt-4o-mini=300" python openai_stub.py --port 8099
+
+Puis lancer l'Analyst avec OPENAI_BASE_URL=http://localhost:8099/v1 pour
+observer le routage des modèles (GET /stats).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from aiohttp import web
+
+RESPONSE = json.dumps({
+    "styles": ["symphonic metal", "gothic metal"],
+    "explanation": "Réponse générée par le serveur de test."
+}, ensure_ascii=False)
+
+
+def parse_latencies(value):
+    latencies = {}
+    for item in filter(None, value.split(",")):
+        model, _, ms = item.partition("=")
+        latencies[model.strip()] = float(ms) / 1000
+    return latencies
+
+
+async def chat_completions(request):
+    body = await request.json()
+    model = body.get("model", "gpt-4o")
+    latency = request.app["latencies"].get(model, request.app["default_latency"])
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(latency)
+        return web.json_response({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": RESPONSE}, "finish_reason": "stop"}]
+        })
+
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    pieces = [RESPONSE[i:i + 8] for i in range(0, len(RESPONSE), 8)]
+    for piece in pieces:
+        await asyncio.sleep(latency / len(pieces))
+        chunk = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+        }
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+def create_app(latencies, default_latency=0.2):
+    app = web.Application()
+    app["latencies"] = latencies
+    app["default_latency"] = default_latency
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+    web.run_app(create_app(parse_latencies(os.getenv("STUB_LATENCY_MS", ""))), port=args.port)
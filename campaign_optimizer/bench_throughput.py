@@ -0,0 +1,154 @@
+"""
+Benchmark du débit de l'Optimizer face à des services amont simulés en local.
+
+Un serveur aiohttp local imite Chartmetric (/token, /artist/search,
+/artist/{id}/similar, /artist/genre/{genre}/top) et le service Analyst
+(/analyze) dans un processus séparé, avec une latence fixe. Le script compare deux modes sur la même
+charge concurrente de build_campaign :
+  - "per-request" : une ClientSession neuve par requête (ancien comportement),
+  - "shared" : la session unique à connexions limitées créée au démarrage.
+
+Usage :
+    python bench_throughput.py [--requests 500] [--concurrency 50] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import multiprocessing
+import socket
+import sys
+import tempfile
+import time
+from aiohttp import web
+
+ARTISTS = ["Nirvana", "Metallica", "Nightwish", "Coldplay", "Green Day", "Rammstein", "Epica", "Muse"]
+
+
+def build_stub(latency):
+    async def delayed(payload):
+        await asyncio.sleep(latency)
+        return web.json_response(payload)
+
+    async def token(request):
+        return await delayed({"token": "bench-token", "expires_in": 3600})
+
+    async def search(request):
+        return await delayed({"obj": {"artists": [{"id": abs(hash(request.query.get("name", ""))) % 100000}]}})
+
+    async def similar(request):
+        return await delayed({"obj": [{"name": f"Similar {request.match_info['artist_id']} {i}"} for i in range(5)]})
+
+    async def genre_top(request):
+        return await delayed({"obj": [{"name": f"Top {request.match_info['genre']} {i}"} for i in range(5)]})
+
+    async def analyze(request):
+        data = await request.json()
+        return await delayed({
+            "artist": data.get("artist"),
+            "song": data.get("song"),
+            "styles": data.get("genres") or ["rock"],
+            "artist_image_url": None,
+            "lookalike_artists": [],
+            "trends": []
+        })
+
+    app = web.Application()
+    app.router.add_post("/token", token)
+    app.router.add_get("/artist/search", search)
+    app.router.add_get("/artist/{artist_id}/similar", similar)
+    app.router.add_get("/artist/genre/{genre}/top", genre_top)
+    app.router.add_post("/analyze", analyze)
+    return app
+
+
+def serve_stub(latency, sock):
+    web.run_app(build_stub(latency), sock=sock, access_log=None, print=None, handle_signals=False)
+
+
+def start_stub(latency):
+    """Démarre le serveur simulé dans un processus séparé et renvoie son URL."""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(1024)
+    process = multiprocessing.Process(target=serve_stub, args=(latency, sock), daemon=True)
+    process.start()
+    return f"http://127.0.0.1:{sock.getsockname()[1]}", process
+
+
+async def run_load(optimizer, mode, total, concurrency):
+    import aiohttp
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        payload = {"artist": ARTISTS[i % len(ARTISTS)], "song": "Bench", "genres": ["rock"], "budget": 1000}
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "shared":
+                await optimizer.build_campaign(optimizer.http_session, payload)
+            else:
+                async with aiohttp.ClientSession() as session:
+                    await optimizer.build_campaign(session, payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1]
+    }
+
+
+async def bench(optimizer, total, concurrency):
+    await optimizer.app.startup()
+    try:
+        # Préchauffage : remplit le cache des genres et ouvre les connexions
+        await run_load(optimizer, "shared", concurrency, concurrency)
+        return {mode: await run_load(optimizer, mode, total, concurrency) for mode in ("per-request", "shared")}
+    finally:
+        await optimizer.app.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    stub_url, stub_process = start_stub(args.latency_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix="optimizer-bench-")
+    os.environ.update({
+        "CHARTMETRIC_API_BASE_URL": stub_url,
+        "ANALYST_SERVICE_URL": stub_url,
+        "CHARTMETRIC_REFRESH_TOKEN": "bench",
+        "YOUTUBE_API_KEY": "bench",
+        # Quota nul : les recherches YouTube échouent immédiatement, sans réseau
+        "YOUTUBE_DAILY_QUOTA": "0",
+        "YOUTUBE_QUOTA_RESERVE": "0",
+        "YOUTUBE_QUOTA_DB": os.path.join(workdir, "youtube_quota.db"),
+        "SIMILARITY_INDEX_DIR": os.path.join(workdir, "similarity_index"),
+        "SIMILAR_ARTISTS_LOG": os.path.join(workdir, "similar_artists.jsonl")
+    })
+
+    import logging
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import campaign_optimizer
+    logging.disable(logging.ERROR)
+
+    try:
+        results = asyncio.run(bench(campaign_optimizer, args.requests, args.concurrency))
+    finally:
+        stub_process.terminate()
+    for mode, result in results.items():
+        print(f"{mode:>12} : {result['rps']:8.1f} req/s  p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms")
+    print(f"Gain du mode shared : x{results['shared']['rps'] / results['per-request']['rps']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import itertools
+import numpy as np
+
+CHANNELS = ["Spotify", "YouTube", "Instagram"]
+
+# Part de l'audience d'un genre atteignable sur chaque canal
+GENRE_CHANNEL_AFFINITY = {
+    "rock": {"Spotify": 0.40, "YouTube": 0.40, "Instagram": 0.20},
+    "punk": {"Spotify": 0.35, "YouTube": 0.35, "Instagram": 0.30},
+    "grunge": {"Spotify": 0.40, "YouTube": 0.45, "Instagram": 0.15},
+    "pop": {"Spotify": 0.35, "YouTube": 0.25, "Instagram": 0.40},
+    "metal": {"Spotify": 0.35, "YouTube": 0.50, "Instagram": 0.15},
+    "symphonic metal": {"Spotify": 0.35, "YouTube": 0.50, "Instagram": 0.15},
+    "industrial metal": {"Spotify": 0.35, "YouTube": 0.50, "Instagram": 0.15},
+    "gothic metal": {"Spotify": 0.35, "YouTube": 0.45, "Instagram": 0.20},
+    "hip hop": {"Spotify": 0.35, "YouTube": 0.35, "Instagram": 0.30},
+    "electronic": {"Spotify": 0.45, "YouTube": 0.30, "Instagram": 0.25},
+    "default": {"Spotify": 0.40, "YouTube": 0.40, "Instagram": 0.20}
+}
+
+# Dépense (en euros) à laquelle un canal atteint environ 63 % de son audience
+CHANNEL_SATURATION = {"Spotify": 800.0, "YouTube": 1000.0, "Instagram": 500.0}
+
+# Audience de base d'une campagne, augmentée par chaque artiste similaire ciblable
+BASE_AUDIENCE = 100000
+LOOKALIKE_AUDIENCE_BOOST = 0.15
+
+DEFAULT_BUDGET = 1000.0
+
+
+def response_curves(genre, lookalike_artists, channels=CHANNELS):
+    """
+    Paramètres des courbes de réponse reach(x) = plafond * (1 - exp(-x / échelle)).
+
+    Returns:
+        tuple: (plafonds, échelles), deux tableaux d'une valeur par canal
+    """
+    affinity = GENRE_CHANNEL_AFFINITY.get(genre.lower(), GENRE_CHANNEL_AFFINITY["default"])
+    audience = BASE_AUDIENCE * (1 + LOOKALIKE_AUDIENCE_BOOST * len(lookalike_artists))
+    ceilings = np.array([audience * affinity[channel] for channel in channels])
+    scales = np.array([CHANNEL_SATURATION[channel] for channel in channels])
+    return ceilings, scales
+
+
+def solve_allocation(ceilings, scales, budgets, mask=None, iterations=60):
+    """
+    Répartit chaque budget entre les canaux pour maximiser le reach total.
+
+    Toutes les lignes (scénarios) sont résolues ensemble. À l'optimum, le
+    reach marginal est égal sur les canaux financés :
+    x_c = échelle_c * max(0, ln(plafond_c / (échelle_c * lambda))),
+    et lambda est trouvé par dichotomie vectorisée pour épuiser chaque budget.
+
+    Args:
+        ceilings (numpy.ndarray): Plafonds d'audience (scénarios x canaux)
+        scales (numpy.ndarray): Échelles de saturation (scénarios x canaux)
+        budgets (numpy.ndarray): Budget de chaque scénario
+        mask (numpy.ndarray, optional): Canaux activés (booléens, scénarios x canaux)
+
+    Returns:
+        tuple: (dépenses, reach), deux tableaux scénarios x canaux
+    """
+    ceilings = np.atleast_2d(np.asarray(ceilings, dtype=np.float64))
+    scales = np.broadcast_to(np.atleast_2d(np.asarray(scales, dtype=np.float64)), ceilings.shape)
+    budgets = np.asarray(budgets, dtype=np.float64).reshape(-1, 1)
+    if mask is None:
+        mask = np.ones(ceilings.shape, dtype=bool)
+
+    # Reach marginal à dépense nulle ; un canal désactivé n'est jamais financé
+    log_marginal = np.where(mask, np.log(ceilings / scales), -np.inf)
+
+    # lambda se situe entre la solution "tous canaux actifs" et le plus grand reach marginal
+    hi = log_marginal.max(axis=1, keepdims=True)
+    active_scales = np.where(mask, scales, 0.0).sum(axis=1, keepdims=True)
+    lo = np.minimum(
+        (np.where(mask, scales * log_marginal, 0.0).sum(axis=1, keepdims=True) - budgets) / active_scales,
+        hi
+    ) - 1.0
+
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        spent = (scales * np.clip(log_marginal - mid, 0.0, None)).sum(axis=1, keepdims=True)
+        over = spent > budgets
+        lo = np.where(over, mid, lo)
+        hi = np.where(over, hi, mid)
+
+    spend = scales * np.clip(log_marginal - hi, 0.0, None)
+    # Corrige l'erreur résiduelle de la dichotomie pour que chaque budget soit exactement réparti
+    totals = spend.sum(axis=1, keepdims=True)
+    spend = np.divide(spend * budgets, totals, out=np.zeros_like(spend), where=totals > 0)
+    reach = ceilings * (1 - np.exp(-spend / scales))
+    return spend, reach
+
+
+def allocate_budget(genre, lookalike_artists, budget=DEFAULT_BUDGET, channels=CHANNELS):
+    """
+    Répartition optimale d'un budget pour une campagne.
+
+    Returns:
+        tuple: (part du budget par canal, reach attendu total)
+    """
+    ceilings, scales = response_curves(genre, lookalike_artists, channels)
+    spend, reach = solve_allocation(ceilings, scales, [budget])
+    shares = {channel: round(float(spend[0, i] / budget), 3) if budget > 0 else 0.0 for i, channel in enumerate(channels)}
+    return shares, int(reach[0].sum())
+
+
+def channel_subsets(channels=CHANNELS):
+    """Toutes les combinaisons non vides de canaux."""
+    return [list(subset) for size in range(1, len(channels) + 1) for subset in itertools.combinations(channels, size)]
+
+
+def evaluate_scenarios(genre, lookalike_artists, budgets, channel_sets=None):
+    """
+    Évalue en une passe vectorisée chaque combinaison budget x ensemble de canaux.
+
+    Returns:
+        list: Un dictionnaire par scénario (budget, canaux, dépense par canal, reach attendu)
+    """
+    channel_sets = channel_sets or channel_subsets()
+    ceilings, scales = response_curves(genre, lookalike_artists)
+    budgets = np.asarray(budgets, dtype=np.float64)
+
+    set_masks = np.array([[channel in channel_set for channel in CHANNELS] for channel_set in channel_sets])
+    mask = np.repeat(set_masks[np.newaxis, :, :], len(budgets), axis=0).reshape(-1, len(CHANNELS))
+    scenario_budgets = np.repeat(budgets, len(channel_sets))
+    spend, reach = solve_allocation(np.tile(ceilings, (len(mask), 1)), scales, scenario_budgets, mask)
+    total_reach = reach.sum(axis=1)
+
+    scenarios = []
+    for row in range(len(mask)):
+        scenarios.append({
+            "budget": float(scenario_budgets[row]),
+            "channels": channel_sets[row % len(channel_sets)],
+            "spend": {channel: round(float(spend[row, i]), 2) for i, channel in enumerate(CHANNELS) if mask[row, i]},
+            "expected_reach": int(total_reach[row])
+        })
+    return scenarios
@@ -0,0 +1,132 @@
+"""
+Construit l'index de similarité des artistes à partir du journal des réponses
+/similar de Chartmetric accumulées par l'Optimizer.
+
+Chaque réponse ajoute au lien artiste -> similaire un poids 1 / (1 + rang) ;
+le lien inverse reçoit la moitié de ce poids, pour que les artistes vus
+seulement comme similaires soient aussi résolus. Le résultat est un graphe
+CSR (names.json, indptr.npy, indices.npy, weights.npy) dont chaque ligne est
+triée par poids décroissant, chargé en mmap par SimilarityIndex. Chaque
+construction écrit une nouvelle version, désignée par le lien "current".
+
+Usage :
+    python build_similarity_index.py [--log data/similar_artists.jsonl] [--output data/similarity_index] [--max-neighbors 50]
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+import numpy as np
+from similarity_index import CURRENT_LINK, normalize_name
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REVERSE_EDGE_FACTOR = 0.5
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Ligne {line_number} ignorée : JSON invalide")
+
+
+def build_graph(records):
+    """Agrège les réponses en poids de liens entre artistes (clés normalisées)."""
+    display_names = {}
+    edges = defaultdict(lambda: defaultdict(float))
+    for record in records:
+        source = record.get("artist")
+        if not source:
+            continue
+        source_key = normalize_name(source)
+        display_names.setdefault(source_key, source)
+        for rank, target in enumerate(record.get("similar", [])):
+            if not target:
+                continue
+            target_key = normalize_name(target)
+            if target_key == source_key:
+                continue
+            display_names.setdefault(target_key, target)
+            weight = 1.0 / (1 + rank)
+            edges[source_key][target_key] += weight
+            edges[target_key][source_key] += weight * REVERSE_EDGE_FACTOR
+    return display_names, edges
+
+
+def to_csr(display_names, edges, max_neighbors):
+    keys = sorted(display_names)
+    position = {key: i for i, key in enumerate(keys)}
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    indices = []
+    weights = []
+    for row, key in enumerate(keys):
+        neighbors = sorted(edges.get(key, {}).items(), key=lambda item: (-item[1], item[0]))[:max_neighbors]
+        indices.extend(position[target] for target, _ in neighbors)
+        weights.extend(weight for _, weight in neighbors)
+        indptr[row + 1] = len(indices)
+    return (
+        [display_names[key] for key in keys],
+        indptr,
+        np.array(indices, dtype=np.int32),
+        np.array(weights, dtype=np.float32)
+    )
+
+
+def write_index(directory, names, indptr, indices, weights):
+    """
+    Écrit l'index dans un nouveau répertoire versionné, puis bascule le lien
+    symbolique "current" dessus par un seul renommage atomique : un lecteur
+    voit toujours les quatre fichiers d'une même version, jamais un mélange.
+    Les versions plus anciennes que la précédente sont supprimées.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version_dir = tempfile.mkdtemp(prefix=f"v{time.strftime('%Y%m%d%H%M%S')}-", dir=directory)
+    os.chmod(version_dir, 0o755)
+    version = os.path.basename(version_dir)
+    for name, array in (("indptr.npy", indptr), ("indices.npy", indices), ("weights.npy", weights)):
+        with open(os.path.join(version_dir, name), "wb") as f:
+            np.save(f, array)
+    with open(os.path.join(version_dir, "names.json"), "w", encoding="utf-8") as f:
+        json.dump(names, f, ensure_ascii=False)
+
+    current = os.path.join(directory, CURRENT_LINK)
+    previous = os.readlink(current) if os.path.islink(current) else None
+    tmp_link = os.path.join(directory, f".{CURRENT_LINK}.tmp")
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(version, tmp_link)
+    os.replace(tmp_link, current)
+
+    # La version précédente est conservée pour les processus qui la chargent encore
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry.startswith("v") and entry not in (version, previous) and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=os.getenv("SIMILAR_ARTISTS_LOG", "data/similar_artists.jsonl"))
+    parser.add_argument("--output", default=os.getenv("SIMILARITY_INDEX_DIR", "data/similarity_index"))
+    parser.add_argument("--max-neighbors", type=int, default=50)
+    args = parser.parse_args()
+
+    display_names, edges = build_graph(read_log(args.log))
+    names, indptr, indices, weights = to_csr(display_names, edges, args.max_neighbors)
+    write_index(args.output, names, indptr, indices, weights)
+    logger.info(f"Index écrit dans {args.output} : {len(names)} artistes, {len(indices)} liens")
+
+
+if __name__ == "__main__":
+    main()
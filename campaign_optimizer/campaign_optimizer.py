@@ -1,14 +1,20 @@
-from flask import Flask, request, jsonify
+from quart import Quart, request, jsonify
 import os
 from dotenv import load_dotenv
 import logging
 import aiohttp
 import asyncio
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
 import urllib.parse
+import time
+import math
+import numpy as np
+from youtube_quota import QUOTA_COSTS, YouTubeQuotaClient
+from chartmetric_token import ChartmetricToken
+from similarity_index import SimilarityIndex, SimilarityLog
+from genre_cache import GenreCache
+from budget_allocation import CHANNELS, DEFAULT_BUDGET, allocate_budget, channel_subsets, evaluate_scenarios
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,8 +33,36 @@ if not chartmetric_refresh_token:
     logger.critical("CHARTMETRIC_REFRESH_TOKEN manquant")
     raise ValueError("CHARTMETRIC_REFRESH_TOKEN manquant")
 
-# Initialisation de l'API YouTube
-youtube = build('youtube', 'v3', developerKey=youtube_api_key)
+# Initialisation de l'API YouTube, avec suivi du quota quotidien
+# Le quota du projet Google (10 000 unités/jour) est partagé entre l'Analyst et
+# l'Optimizer : par défaut 3000 unités pour ce service, 7000 pour l'Analyst.
+# Le décompte est commun aux workers et aux redémarrages via YOUTUBE_QUOTA_DB ; si
+# les deux services montent le même fichier, donner à chacun YOUTUBE_DAILY_QUOTA=10000.
+youtube_client = YouTubeQuotaClient(
+    youtube_api_key,
+    daily_quota=int(os.getenv("YOUTUBE_DAILY_QUOTA", "3000")),
+    reserve=int(os.getenv("YOUTUBE_QUOTA_RESERVE", "500")),
+    ledger_path=os.getenv("YOUTUBE_QUOTA_DB", "data/youtube_quota.db") or None
+)
+
+# Token Chartmetric partagé par le processus, renouvelé avant expiration
+CHARTMETRIC_API_BASE_URL = os.getenv("CHARTMETRIC_API_BASE_URL", "https://api.chartmetric.com/api")
+chartmetric_token = ChartmetricToken(chartmetric_refresh_token, base_url=CHARTMETRIC_API_BASE_URL)
+chartmetric_token.start()
+
+# Session HTTP partagée, créée au démarrage du service (voir startup)
+http_session = None
+
+# Service Analyst, appelé seulement si le superviseur n'a pas fourni d'analyse exploitable
+ANALYST_SERVICE_URL = os.getenv("ANALYST_SERVICE_URL", "https://analyst-production.up.railway.app")
+ANALYST_FETCH_RETRIES = int(os.getenv("ANALYST_FETCH_RETRIES", "2"))
+# Âge maximum d'une analyse fournie avant de la considérer comme périmée, en secondes
+ANALYSIS_MAX_AGE = int(os.getenv("ANALYSIS_MAX_AGE", "86400"))
+
+# Index local des artistes similaires (construit par build_similarity_index.py)
+# et journal des réponses Chartmetric qui l'alimente
+similarity_index = SimilarityIndex.load(os.getenv("SIMILARITY_INDEX_DIR", "data/similarity_index"))
+similarity_log = SimilarityLog(os.getenv("SIMILAR_ARTISTS_LOG", "data/similar_artists.jsonl"))
 
 async def fetch_data(session, url, data, retries=5):
     for attempt in range(retries):
@@ -45,7 +79,7 @@ async def fetch_data(session, url, data, retries=5):
 async def fetch_analysis_data(session, artist, song, genres):
     try:
         data = {'artist': artist, 'song': song, 'genres': genres}
-        return await fetch_data(session, "https://analyst-production.up.railway.app/analyze", data)
+        return await fetch_data(session, f"{ANALYST_SERVICE_URL}/analyze", data, retries=ANALYST_FETCH_RETRIES)
     except Exception as e:
         logger.error(f"Error fetching analysis data: {str(e)}")
         return {
@@ -57,38 +91,38 @@ async def fetch_analysis_data(session, artist, song, genres):
             'trends': []
         }
 
-async def get_chartmetric_access_token(session):
-    url = "https://api.chartmetric.com/api/token"
-    data = {"refreshtoken": chartmetric_refresh_token}
-    headers = {"Content-Type": "application/json"}
+def validate_analysis_data(analysis_data, artist):
+    """Renvoie une copie de l'analyse fournie si elle est exploitable et récente, sinon None."""
+    if not isinstance(analysis_data, dict):
+        return None
 
-    try:
-        async with session.post(url, json=data, headers=headers) as response:
-            response.raise_for_status()
-            result = await response.json()
-            access_token = result.get("token")
-            if not access_token:
-                raise ValueError("Access token non trouvé dans la réponse Chartmetric")
-            return access_token
-    except Exception as e:
-        logger.error(f"Erreur lors de l'obtention de l'access token Chartmetric : {str(e)}")
-        raise
+    styles = analysis_data.get('styles')
+    if not isinstance(styles, list) or not styles or not all(isinstance(style, str) and style.strip() for style in styles):
+        logger.warning("Analyse fournie sans styles exploitables")
+        return None
+
+    if str(analysis_data.get('artist', '')).strip().lower() != artist.strip().lower():
+        logger.warning(f"Analyse fournie pour un autre artiste : {analysis_data.get('artist')}")
+        return None
+
+    analyzed_at = analysis_data.get('analyzed_at')
+    if analyzed_at is not None:
+        if not isinstance(analyzed_at, (int, float)) or time.time() - analyzed_at > ANALYSIS_MAX_AGE:
+            logger.warning("Analyse fournie périmée")
+            return None
+
+    return dict(analysis_data)
 
 async def fetch_chartmetric_similar_artists(session, access_token, artist_name, genre):
-    genre_to_artists = {
-        "rock": ["Nirvana", "Pearl Jam", "Soundgarden"],
-        "punk": ["Green Day", "The Offspring", "Blink-182"],
-        "grunge": ["Nirvana", "Alice in Chains", "Soundgarden"],
-        "pop": ["Coldplay", "Imagine Dragons", "Maroon 5"],
-        "metal": ["Metallica", "Rammstein", "Nightwish"],
-        "symphonic metal": ["Nightwish", "Epica", "Within Temptation"],
-        "industrial metal": ["Rammstein", "Marilyn Manson", "Nine Inch Nails"],
-        "default": ["Nirvana", "Pearl Jam", "Soundgarden"]
-    }
+    if similarity_index is not None:
+        lookalike_artists = similarity_index.top_k(artist_name, 3)
+        if lookalike_artists:
+            logger.info(f"Artistes similaires de {artist_name} trouvés dans l'index local")
+            return lookalike_artists
 
     try:
         encoded_artist_name = urllib.parse.quote(artist_name)
-        search_url = f"https://api.chartmetric.com/api/artist/search?name={encoded_artist_name}"
+        search_url = f"{CHARTMETRIC_API_BASE_URL}/artist/search?name={encoded_artist_name}"
         headers = {"Authorization": f"Bearer {access_token}"}
         async with session.get(search_url, headers=headers) as response:
             response.raise_for_status()
@@ -96,179 +130,256 @@ async def fetch_chartmetric_similar_artists(session, access_token, artist_name,
             artists = result.get("obj", {}).get("artists", [])
             if not artists:
                 logger.warning(f"Artiste {artist_name} non trouvé sur Chartmetric")
-                return genre_to_artists.get(genre.lower(), genre_to_artists["default"])[:3]
+                return default_similar_artists(genre)
 
             artist_id = artists[0].get("id")
             if not artist_id:
                 logger.warning(f"ID de l'artiste {artist_name} non trouvé")
-                return genre_to_artists.get(genre.lower(), genre_to_artists["default"])[:3]
+                return default_similar_artists(genre)
 
-        similar_url = f"https://api.chartmetric.com/api/artist/{artist_id}/similar"
+        similar_url = f"{CHARTMETRIC_API_BASE_URL}/artist/{artist_id}/similar"
         async with session.get(similar_url, headers=headers) as response:
             response.raise_for_status()
             result = await response.json()
             similar_artists = result.get("obj", [])
             if not similar_artists:
                 logger.warning(f"Aucun artiste similaire trouvé pour {artist_name} sur Chartmetric")
-                return genre_to_artists.get(genre.lower(), genre_to_artists["default"])[:3]
+                return default_similar_artists(genre)
 
             lookalike_artists = [artist.get("name") for artist in similar_artists if artist.get("name")]
+            similarity_log.append(artist_name, artist_id, lookalike_artists)
             return lookalike_artists[:3]
 
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des artistes similaires via Chartmetric : {str(e)}")
-        return genre_to_artists.get(genre.lower(), genre_to_artists["default"])[:3]
+        return default_similar_artists(genre)
+
+GENRE_MAPPING = {
+    "metal symphonique": "symphonic metal",
+    "metal indus": "industrial metal",
+    "symphonic metal": "symphonic metal",
+    "industrial metal": "industrial metal",
+    "gothic metal": "gothic metal",
+    "rock": "rock",
+    "punk": "punk",
+    "grunge": "grunge",
+    "pop": "pop",
+    "metal": "metal"
+}
+
+# Artistes de référence par genre, utilisés pour filtrer les recherches YouTube et à défaut de résultats
+GENRE_TO_ARTISTS = {
+    "rock": ["Nirvana", "Pearl Jam", "Soundgarden"],
+    "punk": ["Green Day", "The Offspring", "Blink-182"],
+    "grunge": ["Nirvana", "Alice in Chains", "Soundgarden"],
+    "pop": ["Coldplay", "Imagine Dragons", "Maroon 5"],
+    "metal": ["Metallica", "Rammstein", "Nightwish"],
+    "symphonic metal": ["Nightwish", "Epica", "Within Temptation"],
+    "industrial metal": ["Rammstein", "Marilyn Manson", "Nine Inch Nails"],
+    "default": ["Nirvana", "Pearl Jam", "Soundgarden"]
+}
+
+def default_trends(genre):
+    return [f"best {genre} song 2025", f"best playlist {genre} 2025", f"top {genre} bands 2025", f"new {genre} releases 2025", f"{genre} anthems 2025"]
+
+def default_similar_artists(genre):
+    return GENRE_TO_ARTISTS.get(genre.lower(), GENRE_TO_ARTISTS["default"])[:3]
+
+def default_youtube_data(genre):
+    return default_similar_artists(genre), default_trends(genre)
 
 async def fetch_chartmetric_trends(session, access_token, genre):
-    genre_mapping = {
-        "metal symphonique": "symphonic metal",
-        "metal indus": "industrial metal",
-        "symphonic metal": "symphonic metal",
-        "industrial metal": "industrial metal",
-        "gothic metal": "gothic metal",
-        "rock": "rock",
-        "punk": "punk",
-        "grunge": "grunge",
-        "pop": "pop",
-        "metal": "metal"
-    }
-    chartmetric_genre = genre_mapping.get(genre.lower(), "rock")
+    """Tendances du genre d'après Chartmetric ; les erreurs de l'API sont propagées."""
+    chartmetric_genre = GENRE_MAPPING.get(genre.lower(), "rock")
     encoded_genre = urllib.parse.quote(chartmetric_genre)
 
-    try:
-        charts_url = f"https://api.chartmetric.com/api/artist/genre/{encoded_genre}/top?limit=5"
-        headers = {"Authorization": f"Bearer {access_token}"}
-        async with session.get(charts_url, headers=headers) as response:
-            response.raise_for_status()
-            result = await response.json()
-            artists = result.get("obj", [])
-            if not artists:
-                logger.warning(f"Aucune tendance trouvée pour le genre {genre} sur Chartmetric")
-                return [f"best {genre} song 2025", f"best playlist {genre} 2025", f"top {genre} bands 2025", f"new {genre} releases 2025", f"{genre} anthems 2025"]
-
-            trends = []
-            for artist in artists:
-                artist_name = artist.get("name")
-                if artist_name:
-                    trends.append(f"best {artist_name} songs 2025")
-            return trends[:5]
-
-    except Exception as e:
-        logger.error(f"Erreur lors de la récupération des tendances via Chartmetric : {str(e)}")
-        return [f"best {genre} song 2025", f"best playlist {genre} 2025", f"top {genre} bands 2025", f"new {genre} releases 2025", f"{genre} anthems 2025"]
+    charts_url = f"{CHARTMETRIC_API_BASE_URL}/artist/genre/{encoded_genre}/top?limit=5"
+    headers = {"Authorization": f"Bearer {access_token}"}
+    async with session.get(charts_url, headers=headers) as response:
+        response.raise_for_status()
+        result = await response.json()
+        artists = result.get("obj", [])
+        if not artists:
+            logger.warning(f"Aucune tendance trouvée pour le genre {genre} sur Chartmetric")
+            return default_trends(genre)
+
+        trends = []
+        for artist in artists:
+            artist_name = artist.get("name")
+            if artist_name:
+                trends.append(f"best {artist_name} songs 2025")
+        return trends[:5]
 
 def fetch_youtube_data(genre):
-    genre_to_artists = {
-        "rock": ["Nirvana", "Pearl Jam", "Soundgarden"],
-        "punk": ["Green Day", "The Offspring", "Blink-182"],
-        "grunge": ["Nirvana", "Alice in Chains", "Soundgarden"],
-        "pop": ["Coldplay", "Imagine Dragons", "Maroon 5"],
-        "metal": ["Metallica", "Rammstein", "Nightwish"],
-        "symphonic metal": ["Nightwish", "Epica", "Within Temptation"],
-        "industrial metal": ["Rammstein", "Marilyn Manson", "Nine Inch Nails"],
-        "default": ["Nirvana", "Pearl Jam", "Soundgarden"]
-    }
-
-    long_tail_keywords = [
-        f"best {genre} song 2025",
-        f"best playlist {genre} 2025",
-        f"top {genre} bands 2025",
-        f"new {genre} releases 2025",
-        f"{genre} anthems 2025"
-    ]
-
-    try:
-        search_query = f"{long_tail_keywords[0]}"
-        request = youtube.search().list(
-            part="snippet",
-            q=search_query,
-            type="video",
-            maxResults=5,
-            order="relevance"
-        )
-        response = request.execute()
-
-        lookalike_artists = set()
-        genre_artists = genre_to_artists.get(genre.lower(), genre_to_artists["default"])
-        for item in response.get('items', []):
-            title = item['snippet']['title']
-            description = item['snippet']['description']
-            for artist in genre_artists:
-                if artist.lower() in title.lower() or artist.lower() in description.lower():
-                    lookalike_artists.add(artist)
-                    if len(lookalike_artists) >= 3:
-                        break
-
-        if len(lookalike_artists) < 3:
-            lookalike_artists = genre_artists[:3]
-
-        return list(lookalike_artists)[:3], long_tail_keywords
-
-    except HttpError as e:
-        logger.error(f"Erreur lors de la recherche YouTube : {str(e)}")
-        genre_artists = genre_to_artists.get(genre.lower(), genre_to_artists["default"])
-        return genre_artists[:3], [f"best {genre} song 2025", f"best playlist {genre} 2025", f"top {genre} bands 2025", f"new {genre} releases 2025", f"{genre} anthems 2025"]
+    """Artistes similaires et mots-clés du genre d'après YouTube ; les erreurs de l'API sont propagées."""
+    long_tail_keywords = default_trends(genre)
+
+    search_query = f"{long_tail_keywords[0]}"
+    items = youtube_client.search(search_query, max_results=5)
+
+    lookalike_artists = set()
+    genre_artists = GENRE_TO_ARTISTS.get(genre.lower(), GENRE_TO_ARTISTS["default"])
+    for item in items:
+        title = item['snippet']['title']
+        description = item['snippet']['description']
+        for artist in genre_artists:
+            if artist.lower() in title.lower() or artist.lower() in description.lower():
+                lookalike_artists.add(artist)
+                if len(lookalike_artists) >= 3:
+                    break
+
+    if len(lookalike_artists) < 3:
+        lookalike_artists = genre_artists[:3]
+
+    return list(lookalike_artists)[:3], long_tail_keywords
+
+# Cache par genre des tendances Chartmetric et des recherches YouTube
+genre_cache = GenreCache(
+    ttl=int(os.getenv("GENRE_CACHE_TTL", "3600")),
+    max_stale=int(os.getenv("GENRE_CACHE_MAX_STALE", "86400"))
+)
+
+def youtube_loader(genre):
+    async def load(session):
+        return await asyncio.to_thread(fetch_youtube_data, genre)
+    return load
+
+def trends_loader(genre):
+    async def load(session):
+        access_token = await chartmetric_token.get_access_token()
+        return await fetch_chartmetric_trends(session, access_token, genre)
+    return load
+
+# Le préchauffage des recherches YouTube coûte une recherche (100 unités) par genre à
+# chaque démarrage : désactivé par défaut, ces données sont chargées à la première demande
+GENRE_CACHE_WARM_YOUTUBE = os.getenv("GENRE_CACHE_WARM_YOUTUBE", "false").lower() in ("1", "true", "yes")
+
+def warm_genre_cache():
+    """Charge en arrière-plan les tendances de chaque genre connu, et les recherches YouTube si le budget le permet."""
+    for genre in GENRE_MAPPING:
+        genre_cache.refresh(("trends", genre), trends_loader(genre))
+
+    if not GENRE_CACHE_WARM_YOUTUBE:
+        return
+    quota = youtube_client.snapshot()
+    warm_cost = QUOTA_COSTS["search.list"] * len(GENRE_MAPPING)
+    if quota["remaining"] - warm_cost < youtube_client.reserve:
+        logger.info(f"Préchauffage YouTube ignoré : {quota['remaining']} unités restantes, {warm_cost} nécessaires")
+        return
+    for genre in GENRE_MAPPING:
+        genre_cache.refresh(("youtube", genre), youtube_loader(genre))
+
+@app.before_serving
+async def startup():
+    """Crée la session HTTP partagée et préchauffe le cache des genres."""
+    global http_session
+    connector = aiohttp.TCPConnector(
+        limit=int(os.getenv("OPTIMIZER_MAX_CONNECTIONS", "100")),
+        ttl_dns_cache=300,
+        keepalive_timeout=60
+    )
+    http_session = aiohttp.ClientSession(connector=connector)
+    genre_cache.start(http_session)
+    warm_genre_cache()
+
+@app.after_serving
+async def shutdown():
+    await genre_cache.stop()
+    await http_session.close()
+    chartmetric_token.stop()
 
 def combine_data(youtube_data, chartmetric_data):
     youtube_artists, youtube_trends = youtube_data
     chartmetric_artists, chartmetric_trends = chartmetric_data
 
-    combined_artists = list(set(youtube_artists + chartmetric_artists))[:3]
-    combined_trends = list(set(youtube_trends + chartmetric_trends))[:5]
+    # Dédoublonnage en conservant l'ordre : les résultats propres à l'artiste (Chartmetric) passent en premier
+    combined_artists = list(dict.fromkeys(chartmetric_artists + youtube_artists))[:3]
+    combined_trends = list(dict.fromkeys(chartmetric_trends + youtube_trends))[:5]
 
     return combined_artists, combined_trends
 
+def parse_budget(value):
+    """
+    Convertit le budget demandé en nombre.
+
+    Raises:
+        ValueError: Si le budget n'est pas un nombre fini positif ou nul
+    """
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Budget invalide : {value!r}")
+    if not math.isfinite(budget) or budget < 0:
+        raise ValueError(f"Budget invalide : {value!r}")
+    return budget
+
+async def build_campaign(session, data):
+    """Construit l'analyse enrichie et la stratégie d'une campagne."""
+    artist = data.get('artist', 'Artiste Inconnu')
+    song = data.get('song', '')
+    genres = data.get('genres', ['rock']) if isinstance(data.get('genres'), list) else [data.get('genres', 'rock')]
+    budget = parse_budget(data.get('budget', DEFAULT_BUDGET))
+
+    logger.info(f"Optimizing campaign for artist: {artist}, song: {song}")
+
+    analysis_data = validate_analysis_data(data.get('analyst_data'), artist)
+    if analysis_data is None:
+        logger.info(f"Aucune analyse exploitable fournie, appel au service Analyst pour {artist}")
+        analysis_data = await fetch_analysis_data(session, artist, song, genres)
+
+    access_token = await chartmetric_token.get_access_token()
+
+    refined_styles = analysis_data.get('styles', genres)
+    primary_style = refined_styles[0] if refined_styles else genres[0]
+
+    # Enrichissements indépendants lancés en parallèle ; les données par genre viennent du cache
+    (youtube_lookalikes, youtube_trends), chartmetric_lookalikes, chartmetric_trends = await asyncio.gather(
+        genre_cache.get(("youtube", primary_style.lower()), youtube_loader(primary_style), session,
+                        fallback=lambda: default_youtube_data(primary_style)),
+        fetch_chartmetric_similar_artists(session, access_token, artist, primary_style),
+        genre_cache.get(("trends", primary_style.lower()), trends_loader(primary_style), session,
+                        fallback=lambda: default_trends(primary_style))
+    )
+
+    combined_lookalikes, combined_trends = combine_data(
+        (youtube_lookalikes, youtube_trends),
+        (chartmetric_lookalikes, chartmetric_trends)
+    )
+
+    logger.info(f"Analysis data used for optimization: {analysis_data}")
+
+    analysis_data['trends'] = combined_trends
+    analysis_data['lookalike_artists'] = combined_lookalikes
+
+    budget_allocation, expected_reach = allocate_budget(primary_style, combined_lookalikes, budget)
+    strategy = {
+        "target_audience": f"Fans of {', '.join(combined_lookalikes)}",
+        "channels": CHANNELS,
+        "budget": budget,
+        "budget_allocation": budget_allocation,
+        "expected_reach": expected_reach
+    }
+
+    return {
+        "analysis": analysis_data,
+        "strategy": strategy
+    }
+
 @app.route('/optimize', methods=['POST'])
 async def optimize_campaign():
     try:
-        data = request.get_json()
+        data = await request.get_json()
         if not data:
             logger.error("Aucune donnée JSON fournie")
             return jsonify({"error": "Aucune donnée fournie"}), 400
 
-        artist = data.get('artist', 'Artiste Inconnu')
-        song = data.get('song', '')
-        genres = data.get('genres', ['rock']) if isinstance(data.get('genres'), list) else [data.get('genres', 'rock')]
-
-        logger.info(f"Optimizing campaign for artist: {artist}, song: {song}")
-
-        async with aiohttp.ClientSession() as session:
-            analysis_data = await fetch_analysis_data(session, artist, song, genres)
-
-            access_token = await get_chartmetric_access_token(session)
-
-            refined_styles = analysis_data.get('styles', genres)
-            primary_style = refined_styles[0] if refined_styles else genres[0]
-
-            youtube_lookalikes, youtube_trends = fetch_youtube_data(primary_style)
-            chartmetric_lookalikes = await fetch_chartmetric_similar_artists(session, access_token, artist, primary_style)
-            chartmetric_trends = await fetch_chartmetric_trends(session, access_token, primary_style)
-
-        combined_lookalikes, combined_trends = combine_data(
-            (youtube_lookalikes, youtube_trends),
-            (chartmetric_lookalikes, chartmetric_trends)
-        )
-
-        logger.info(f"Successfully fetched data from https://analyst-production.up.railway.app/analyze: {analysis_data}")
-
-        analysis_data['trends'] = combined_trends
-        analysis_data['lookalike_artists'] = combined_lookalikes
-
-        strategy = {
-            "target_audience": f"Fans of {', '.join(combined_lookalikes)}",
-            "channels": ["Spotify", "YouTube", "Instagram"],
-            "budget_allocation": {
-                "Spotify": 0.4,
-                "YouTube": 0.4,
-                "Instagram": 0.2
-            }
-        }
-
-        response = {
-            "analysis": analysis_data,
-            "strategy": strategy
-        }
+        try:
+            parse_budget(data.get('budget', DEFAULT_BUDGET))
+        except ValueError as e:
+            logger.error(str(e))
+            return jsonify({"error": str(e)}), 400
 
+        response = await build_campaign(http_session, data)
         logger.info(f"Returning optimized campaign: {response}")
         return jsonify(response)
 
@@ -276,5 +387,65 @@ async def optimize_campaign():
         logger.error(f"Error in optimize_campaign: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Nombre maximum de scénarios évalués par requête
+MAX_SCENARIOS = 50000
+
+@app.route('/optimize/scenarios', methods=['POST'])
+async def optimize_scenarios():
+    try:
+        data = await request.get_json()
+        if not data:
+            logger.error("Aucune donnée JSON fournie")
+            return jsonify({"error": "Aucune donnée fournie"}), 400
+
+        genres = data.get('genres', ['rock']) if isinstance(data.get('genres'), list) else [data.get('genres', 'rock')]
+        style = data.get('style') or (genres[0] if genres else 'rock')
+        lookalike_artists = data.get('lookalike_artists', [])
+
+        channel_sets = data.get('channel_sets') or channel_subsets()
+        invalid = [channel for channel_set in channel_sets for channel in channel_set if channel not in CHANNELS]
+        if invalid or not all(channel_sets):
+            return jsonify({"error": f"Canaux invalides : {invalid or 'ensemble vide'}"}), 400
+
+        # Budgets explicites ou plage {"min", "max", "steps"} ; le nombre de scénarios est
+        # vérifié avant de construire la plage, pour ne jamais allouer un tableau démesuré
+        budgets = data.get('budgets')
+        if budgets is None:
+            budget_range = data.get('budget_range', {})
+            steps = int(budget_range.get('steps', 100))
+            if steps < 1:
+                return jsonify({"error": "Le nombre de pas (steps) doit être au moins 1"}), 400
+            budget_count = steps
+        else:
+            budget_count = len(budgets)
+
+        scenario_count = budget_count * len(channel_sets)
+        if scenario_count > MAX_SCENARIOS:
+            return jsonify({"error": f"Trop de scénarios : {scenario_count} (max {MAX_SCENARIOS})"}), 400
+
+        if budgets is None:
+            budgets = np.linspace(
+                float(budget_range.get('min', 100)),
+                float(budget_range.get('max', 10000)),
+                steps
+            )
+
+        scenarios = evaluate_scenarios(style, lookalike_artists, budgets, channel_sets)
+        return jsonify({"style": style, "channels": CHANNELS, "scenarios": scenarios})
+
+    except (TypeError, ValueError) as e:
+        logger.error(f"Paramètres de scénarios invalides : {str(e)}")
+        return jsonify({"error": f"Paramètres invalides : {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"Error in optimize_scenarios: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    return jsonify({
+        "youtube_quota": youtube_client.snapshot(),
+        "genre_cache": genre_cache.snapshot()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8080)
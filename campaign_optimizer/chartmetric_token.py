@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import threading
+import time
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class ChartmetricToken:
+    """
+    Access token Chartmetric partagé par tout le processus.
+
+    Le token est renouvelé par un thread d'arrière-plan avant son expiration,
+    si bien que les requêtes le trouvent presque toujours valide. Quand un
+    renouvellement est malgré tout nécessaire sur le chemin d'une requête, un
+    verrou garantit qu'un seul appel à /token est fait à la fois.
+    """
+
+    def __init__(self, refresh_token, base_url="https://api.chartmetric.com/api", refresh_margin=300, timeout=10):
+        """
+        Args:
+            refresh_token (str): Refresh token Chartmetric
+            base_url (str): URL de base de l'API Chartmetric
+            refresh_margin (int): Délai avant expiration auquel le token est renouvelé, en secondes
+            timeout (int): Timeout de l'appel à /token, en secondes
+        """
+        self.refresh_token = refresh_token
+        self.base_url = base_url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.access_token = None
+        self.expires_at = 0
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _is_usable(self):
+        # Marge courte : le token reste utilisable tant que le renouvellement d'arrière-plan est en cours
+        return self.access_token is not None and time.time() < self.expires_at - 30
+
+    def _refresh(self):
+        url = f"{self.base_url}/token"
+        response = requests.post(url, json={"refreshtoken": self.refresh_token}, timeout=self.timeout)
+        response.raise_for_status()
+        result = response.json()
+        access_token = result.get("token")
+        if not access_token:
+            raise ValueError("Access token non trouvé dans la réponse Chartmetric")
+        self.access_token = access_token
+        self.expires_at = time.time() + result.get("expires_in", 3600)
+        self.refresh_count += 1
+        logger.info(f"Nouveau access token Chartmetric obtenu, valide jusqu'à {time.ctime(self.expires_at)}")
+
+    def current(self):
+        """Renvoie un token valide, en le renouvelant si nécessaire (appel bloquant)."""
+        if self._is_usable():
+            return self.access_token
+        with self._lock:
+            if not self._is_usable():
+                self._refresh()
+            return self.access_token
+
+    async def get_access_token(self):
+        """Renvoie un token valide sans bloquer la boucle d'événements."""
+        if self._is_usable():
+            return self.access_token
+        return await asyncio.to_thread(self.current)
+
+    def start(self):
+        """Démarre le renouvellement en arrière-plan."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="chartmetric-token", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self.expires_at - self.refresh_margin - time.time()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            try:
+                with self._lock:
+                    if time.time() >= self.expires_at - self.refresh_margin:
+                        self._refresh()
+            except Exception as e:
+                logger.error(f"Erreur lors du renouvellement du token Chartmetric : {str(e)}")
+                self._stop.wait(30)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class GenreCache:
+    """
+    Cache des données par genre (tendances, recherches YouTube) en stale-while-revalidate.
+
+    Une entrée fraîche est servie directement. Une entrée périmée (mais plus
+    jeune que max_stale) est servie immédiatement pendant qu'un unique
+    rafraîchissement tourne en arrière-plan. Seule une entrée absente est
+    chargée sur le chemin de la requête.
+
+    Les loaders lèvent une exception en cas d'échec de la source : un
+    rafraîchissement en échec conserve la valeur précédente, et une valeur de
+    repli n'est jamais mise en cache.
+
+    Les rafraîchissements sont des tâches de la boucle d'événements du service
+    et utilisent la session HTTP partagée fournie à start().
+    """
+
+    def __init__(self, ttl=3600, max_stale=86400):
+        """
+        Args:
+            ttl (int): Âge au-delà duquel une entrée est rafraîchie, en secondes
+            max_stale (int): Âge au-delà duquel une entrée n'est plus servie, en secondes
+        """
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self._entries = {}
+        self._refreshing = {}
+        self._session = None
+        self.stats = {"fresh": 0, "stale": 0, "miss": 0, "load_errors": 0, "refreshes": 0, "refresh_errors": 0}
+
+    def start(self, session):
+        """Fournit la session HTTP utilisée par les rafraîchissements d'arrière-plan."""
+        self._session = session
+
+    async def stop(self):
+        """Annule les rafraîchissements en cours."""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+
+    async def get(self, key, loader, session, fallback=None):
+        """
+        Renvoie la valeur d'une clé.
+
+        Args:
+            key (tuple): Clé de l'entrée, par exemple ("trends", "metal")
+            loader: Fonction async prenant une session aiohttp et renvoyant la valeur
+            session (aiohttp.ClientSession): Session utilisée en cas d'absence
+            fallback (callable, optional): Valeur de repli renvoyée, sans mise en cache,
+                                           si l'entrée est absente et que le chargement échoue
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.stats["fresh"] += 1
+                return value
+            if age < self.max_stale:
+                self.stats["stale"] += 1
+                self.refresh(key, loader)
+                return value
+
+        # Absente : si un rafraîchissement est déjà en cours (préchauffage), on l'attend
+        pending = self._refreshing.get(key)
+        if pending is not None:
+            await asyncio.shield(pending)
+            if key in self._entries:
+                return self._entries[key][0]
+
+        self.stats["miss"] += 1
+        try:
+            value = await loader(session)
+        except Exception as e:
+            if fallback is None:
+                raise
+            self.stats["load_errors"] += 1
+            logger.error(f"Erreur lors du chargement de {key}, valeur de repli servie : {str(e)}")
+            return fallback()
+        self._entries[key] = (value, time.monotonic())
+        return value
+
+    def refresh(self, key, loader):
+        """Planifie le rafraîchissement d'une clé, sauf si un rafraîchissement est déjà en cours."""
+        if key in self._refreshing:
+            return
+        task = asyncio.ensure_future(self._refresh(key, loader))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _refresh(self, key, loader):
+        try:
+            value = await loader(self._session)
+            self._entries[key] = (value, time.monotonic())
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.error(f"Erreur lors du rafraîchissement du cache pour {key} : {str(e)}")
+
+    def snapshot(self):
+        return {**self.stats, "entries": len(self._entries), "refreshing": len(self._refreshing)}
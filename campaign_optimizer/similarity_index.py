@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILES = ("names.json", "indptr.npy", "indices.npy", "weights.npy")
+# Lien symbolique vers la version courante de l'index (voir build_similarity_index.write_index)
+CURRENT_LINK = "current"
+
+
+def normalize_name(name):
+    """Clé de recherche d'un artiste : minuscules, espaces normalisés."""
+    return " ".join(name.casefold().split())
+
+
+class SimilarityIndex:
+    """
+    Graphe de similarité entre artistes au format CSR, chargé en mémoire partagée (mmap).
+
+    Les voisins de chaque artiste sont triés par poids décroissant à la
+    construction (voir build_similarity_index.py) : le top-k est une simple
+    tranche du tableau.
+    """
+
+    def __init__(self, names, indptr, indices, weights):
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self._lookup = {normalize_name(name): i for i, name in enumerate(names)}
+
+    @classmethod
+    def load(cls, directory):
+        """Charge un index ; renvoie None s'il n'a pas encore été construit."""
+        # Le lien est résolu une seule fois : les quatre fichiers viennent de la même version
+        current = os.path.join(directory, CURRENT_LINK)
+        if os.path.islink(current):
+            directory = os.path.realpath(current)
+        if not all(os.path.exists(os.path.join(directory, name)) for name in INDEX_FILES):
+            logger.warning(f"Index de similarité absent dans {directory}, les artistes similaires viendront de Chartmetric")
+            return None
+        with open(os.path.join(directory, "names.json"), encoding="utf-8") as f:
+            names = json.load(f)
+        index = cls(
+            names,
+            np.load(os.path.join(directory, "indptr.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "indices.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "weights.npy"), mmap_mode="r")
+        )
+        logger.info(f"Index de similarité chargé : {len(names)} artistes, {len(index.indices)} liens")
+        return index
+
+    def __contains__(self, artist_name):
+        return normalize_name(artist_name) in self._lookup
+
+    def top_k(self, artist_name, k=3):
+        """
+        Renvoie les k artistes les plus similaires, ou None si l'artiste est inconnu de l'index.
+        """
+        row = self._lookup.get(normalize_name(artist_name))
+        if row is None:
+            return None
+        start, end = self.indptr[row], self.indptr[row + 1]
+        if start == end:
+            return None
+        return [self.names[i] for i in self.indices[start:min(end, start + k)]]
+
+
+class SimilarityLog:
+    """Journal (JSON Lines) des réponses /similar de Chartmetric, source de l'index."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, artist_name, artist_id, similar_artists):
+        """
+        Ajoute une réponse au journal.
+
+        Args:
+            artist_name (str): Artiste recherché
+            artist_id (int): ID Chartmetric de l'artiste
+            similar_artists (list): Noms des artistes similaires, dans l'ordre de Chartmetric
+        """
+        record = {"artist": artist_name, "artist_id": artist_id, "similar": similar_artists, "fetched_at": time.time()}
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"Impossible d'écrire dans le journal de similarité : {str(e)}")
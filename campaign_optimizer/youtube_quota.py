@@ -0,0 +1,295 @@
+"""
+Accès à l'API YouTube Data avec suivi du quota quotidien.
+
+Ce module est copié à l'identique dans campaign_analyst et campaign_optimizer :
+chaque service est construit comme une image indépendante à partir de son
+propre répertoire et ne peut pas importer de code extérieur. Toute
+modification doit être reportée dans les deux copies.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from cachetools import LRUCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Coût en unités de quota de chaque méthode de l'API YouTube Data v3
+QUOTA_COSTS = {
+    "search.list": 100,
+    "videos.list": 1
+}
+
+# Nombre maximum d'IDs acceptés par videos.list
+MAX_IDS_PER_VIDEOS_CALL = 50
+
+# Le quota quotidien est remis à zéro à minuit, heure du Pacifique (UTC-8 hors heure d'été)
+QUOTA_RESET_UTC_OFFSET = -8 * 3600
+
+
+def build_youtube_service(api_key):
+    """
+    Construit le client YouTube à partir d'un document de découverte local.
+
+    Utilise le document indiqué par YOUTUBE_DISCOVERY_DOC s'il est défini,
+    sinon celui fourni avec google-api-python-client : aucun appel réseau
+    n'est fait pour télécharger le document de découverte.
+    """
+    from googleapiclient.discovery import build, build_from_document
+
+    discovery_doc = os.getenv("YOUTUBE_DISCOVERY_DOC")
+    if discovery_doc:
+        with open(discovery_doc, encoding="utf-8") as f:
+            return build_from_document(f.read(), developerKey=api_key)
+    return build('youtube', 'v3', developerKey=api_key, static_discovery=True, cache_discovery=False)
+
+
+class QuotaLedger:
+    """
+    Compteur de quota partagé, stocké dans SQLite et indexé par jour de quota.
+
+    Tous les processus qui pointent vers le même fichier (workers, redémarrages,
+    services montant le même volume) décomptent le même budget : la vérification
+    et l'incrément se font dans une seule transaction verrouillée.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS quota_spent (
+        day TEXT NOT NULL,
+        endpoint TEXT NOT NULL,
+        units INTEGER NOT NULL,
+        PRIMARY KEY (day, endpoint)
+    )
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(self.SCHEMA)
+            connection.execute("DELETE FROM quota_spent WHERE day < date('now', '-7 days')")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def try_spend(self, day, endpoint, units, limit):
+        """Ajoute units au jour donné si le total reste inférieur ou égal à limit ; renvoie False sinon."""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            total = connection.execute("SELECT COALESCE(SUM(units), 0) FROM quota_spent WHERE day = ?", (day,)).fetchone()[0]
+            if total + units > limit:
+                connection.execute("ROLLBACK")
+                return False
+            connection.execute(
+                "INSERT INTO quota_spent (day, endpoint, units) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, endpoint) DO UPDATE SET units = units + excluded.units",
+                (day, endpoint, units)
+            )
+            connection.execute("COMMIT")
+            return True
+        finally:
+            connection.close()
+
+    def spent(self, day):
+        """Unités consommées par méthode pour le jour donné."""
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT endpoint, units FROM quota_spent WHERE day = ?", (day,)).fetchall()
+        finally:
+            connection.close()
+        return dict(rows)
+
+
+class QuotaExceededError(Exception):
+    """Le budget quotidien est presque épuisé et aucune donnée en cache n'est disponible."""
+
+
+class YouTubeQuotaClient:
+    """
+    Accès à l'API YouTube Data avec suivi du quota consommé par méthode.
+
+    Les recherches identiques sont mises en cache, les statistiques des vidéos
+    sont récupérées par lots de 50 IDs. Lorsque le budget restant passe sous la
+    réserve, seules les données en cache (même expirées) sont servies.
+    """
+
+    def __init__(self, api_key, daily_quota=10000, reserve=1000, search_ttl=21600, stats_ttl=3600, ledger_path=None):
+        """
+        Args:
+            api_key (str): Clé de l'API YouTube Data
+            daily_quota (int): Budget quotidien décompté par ce compteur, en unités : le quota
+                               du projet Google si le compteur est partagé par tous les services,
+                               sinon la part attribuée à ce service
+            reserve (int): Unités conservées en réserve ; en dessous, seul le cache est utilisé
+            search_ttl (int): Durée de vie des résultats de recherche en secondes
+            stats_ttl (int): Durée de vie des statistiques de vidéos en secondes
+            ledger_path (str, optional): Fichier SQLite du compteur partagé (voir QuotaLedger) ;
+                                         sans fichier, le décompte est propre au processus
+        """
+        self._api_key = api_key
+        self._youtube = None
+        self.daily_quota = daily_quota
+        self.reserve = reserve
+        # Protège le compteur local, les caches (cachetools n'est pas thread-safe) et les
+        # compteurs de hits : les appels arrivent depuis plusieurs threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._day = self._quota_day()
+        self._spent = {endpoint: 0 for endpoint in QUOTA_COSTS}
+        self._ledger = QuotaLedger(ledger_path) if ledger_path else None
+        self._search_cache = TTLCache(maxsize=1000, ttl=search_ttl)
+        self._stats_cache = TTLCache(maxsize=5000, ttl=stats_ttl)
+        # Dernières valeurs connues, servies quand le budget est épuisé
+        self._stale_searches = LRUCache(maxsize=5000)
+        self._stale_stats = LRUCache(maxsize=20000)
+        self._cache_hits = 0
+        self._stale_hits = 0
+
+    def _service(self):
+        """Construit le client YouTube au premier appel."""
+        if self._youtube is None:
+            with self._build_lock:
+                if self._youtube is None:
+                    self._youtube = build_youtube_service(self._api_key)
+        return self._youtube
+
+    @staticmethod
+    def _quota_day():
+        return time.strftime("%Y-%m-%d", time.gmtime(time.time() + QUOTA_RESET_UTC_OFFSET))
+
+    def _spend(self, endpoint, calls=1):
+        """Réserve les unités d'un appel ; renvoie False si le budget ne le permet plus."""
+        units = QUOTA_COSTS[endpoint] * calls
+        if self._ledger is not None:
+            try:
+                return self._ledger.try_spend(self._quota_day(), endpoint, units, self.daily_quota - self.reserve)
+            except sqlite3.Error as e:
+                # Compteur partagé indisponible : décompte local en attendant
+                logger.error(f"Compteur de quota YouTube indisponible : {str(e)}")
+        with self._lock:
+            day = self._quota_day()
+            if day != self._day:
+                self._day = day
+                self._spent = {name: 0 for name in QUOTA_COSTS}
+            if self.daily_quota - sum(self._spent.values()) - units < self.reserve:
+                return False
+            self._spent[endpoint] += units
+            return True
+
+    def search(self, query, max_results=5, order="relevance"):
+        """
+        Recherche des vidéos (search.list, 100 unités), avec cache.
+
+        Returns:
+            list: Les items renvoyés par l'API
+
+        Raises:
+            QuotaExceededError: Si le budget est épuisé et que la recherche n'a jamais été faite
+            HttpError: En cas d'erreur de l'API
+        """
+        key = (query, max_results, order)
+        with self._lock:
+            items = self._search_cache.get(key)
+            if items is not None:
+                self._cache_hits += 1
+                return items
+
+        if not self._spend("search.list"):
+            with self._lock:
+                items = self._stale_searches.get(key)
+                if items is not None:
+                    self._stale_hits += 1
+            if items is None:
+                raise QuotaExceededError(f"Quota YouTube presque épuisé, recherche ignorée : {query}")
+            logger.warning(f"Quota YouTube presque épuisé, résultat en cache servi pour : {query}")
+            return items
+
+        response = self._service().search().list(
+            part="snippet",
+            q=query,
+            type="video",
+            maxResults=max_results,
+            order=order
+        ).execute()
+        items = response.get("items", [])
+        with self._lock:
+            self._search_cache[key] = items
+            self._stale_searches[key] = items
+        return items
+
+    def video_statistics(self, video_ids):
+        """
+        Récupère les statistiques de plusieurs vidéos (videos.list, 1 unité par lot de 50).
+
+        Les vidéos dont les statistiques ne peuvent pas être obtenues (budget
+        épuisé sans cache) sont absentes du résultat.
+
+        Returns:
+            dict: Statistiques indexées par ID de vidéo
+        """
+        statistics = {}
+        missing = []
+        with self._lock:
+            for video_id in dict.fromkeys(video_ids):
+                stats = self._stats_cache.get(video_id)
+                if stats is not None:
+                    self._cache_hits += 1
+                    statistics[video_id] = stats
+                else:
+                    missing.append(video_id)
+
+        for start in range(0, len(missing), MAX_IDS_PER_VIDEOS_CALL):
+            batch = missing[start:start + MAX_IDS_PER_VIDEOS_CALL]
+            if not self._spend("videos.list"):
+                with self._lock:
+                    for video_id in batch:
+                        stats = self._stale_stats.get(video_id)
+                        if stats is not None:
+                            self._stale_hits += 1
+                            statistics[video_id] = stats
+                logger.warning(f"Quota YouTube presque épuisé, statistiques en cache servies pour {len(batch)} vidéos")
+                continue
+
+            # Pas de maxResults : l'API le refuse quand le paramètre id est fourni
+            response = self._service().videos().list(
+                part="statistics",
+                id=",".join(batch)
+            ).execute()
+            with self._lock:
+                for item in response.get("items", []):
+                    stats = item.get("statistics", {})
+                    self._stats_cache[item["id"]] = stats
+                    self._stale_stats[item["id"]] = stats
+                    statistics[item["id"]] = stats
+
+        return statistics
+
+    def snapshot(self):
+        """Renvoie l'état courant du quota et du cache."""
+        if self._ledger is not None:
+            day = self._quota_day()
+            try:
+                spent = {endpoint: 0 for endpoint in QUOTA_COSTS}
+                spent.update(self._ledger.spent(day))
+            except sqlite3.Error:
+                with self._lock:
+                    spent = dict(self._spent)
+        else:
+            with self._lock:
+                spent = dict(self._spent)
+                day = self._day
+        with self._lock:
+            cache_hits, stale_hits = self._cache_hits, self._stale_hits
+        remaining = self.daily_quota - sum(spent.values())
+        return {
+            "day": day,
+            "daily_quota": self.daily_quota,
+            "spent": spent,
+            "remaining": remaining,
+            "degraded": remaining - max(QUOTA_COSTS.values()) < self.reserve,
+            "cache_hits": cache_hits,
+            "stale_hits": stale_hits
+        }
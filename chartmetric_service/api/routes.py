@@ -1,20 +1,119 @@
 # Dans api/routes.py
+import os
+from typing import List, Optional
+from fastapi import HTTPException
+from pydantic import BaseModel
+from store.stats_store import from_day
 
-def register_routes(app, chartmetric_client) :
+# Nombre maximum d'artistes par requête groupée
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+
+class ArtistBatchRequest(BaseModel):
+    ids: List[int]
+
+class ArtistStatsBatchRequest(BaseModel):
+    ids: List[int]
+    source: str = "spotify"
+
+class StatsHistoryRequest(BaseModel):
+    ids: List[int]
+    source: str = "spotify"
+    metric: str = "followers"
+    start: Optional[str] = None
+    end: Optional[str] = None
+    # Fenêtre de moyenne mobile, en nombre de relevés (aucune si None)
+    window: Optional[int] = None
+
+class StatsGrowthRequest(BaseModel):
+    ids: List[int]
+    source: str = "spotify"
+    metric: str = "followers"
+    days: int = 30
+
+def check_batch_size(ids):
+    if not ids:
+        raise HTTPException(status_code=400, detail="La liste d'IDs est vide")
+    if len(set(ids)) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Trop d'artistes : {len(set(ids))} (max {MAX_BATCH_SIZE})")
+
+def register_routes(app, chartmetric_client, stats_store=None) :
     """
     Enregistre les routes de l'API pour FastAPI.
-    
+
     Args:
         app: L'application FastAPI
         chartmetric_client: Le client Chartmetric
+        stats_store: L'historique des statistiques d'artistes (routes d'historique désactivées si None)
     """
-    
+
     @app.get('/api/artist/{artist_id}')
     async def get_artist(artist_id: int):
-        return await chartmetric_client.get_artist(artist_id)
-    
+        artist = await chartmetric_client.get_artist(artist_id)
+        if artist is None:
+            raise HTTPException(status_code=404, detail=f"Artiste {artist_id} introuvable")
+        return artist
+
     @app.get('/api/artist/{artist_id}/stats')
-    async def get_artist_stats(artist_id: int):
-        return await chartmetric_client.get_artist_stats(artist_id)
-    
+    async def get_artist_stats(artist_id: int, source: str = "spotify"):
+        stats = await chartmetric_client.get_artist_stats(artist_id, source)
+        if stats is None:
+            raise HTTPException(status_code=404, detail=f"Statistiques de l'artiste {artist_id} introuvables")
+        return stats
+
+    @app.post('/api/artists/batch')
+    async def get_artists_batch(request_data: ArtistBatchRequest):
+        check_batch_size(request_data.ids)
+        return await chartmetric_client.get_artists_batch(request_data.ids)
+
+    @app.post('/api/artists/stats/batch')
+    async def get_artists_stats_batch(request_data: ArtistStatsBatchRequest):
+        check_batch_size(request_data.ids)
+        return await chartmetric_client.get_artists_stats_batch(request_data.ids, request_data.source)
+
+    @app.get('/api/artists/suggest')
+    async def suggest_artists(name: str, limit: int = 5):
+        # Noms approchants parmi les artistes déjà rencontrés : de simples suggestions,
+        # la résolution d'un nom passe toujours par une correspondance exacte
+        if chartmetric_client.artist_index is None:
+            return []
+        return chartmetric_client.artist_index.suggest(name, max(1, min(limit, 20)))
+
+    if stats_store is None:
+        return
+
+    @app.post('/api/artists/stats/history')
+    async def get_artists_stats_history(request_data: StatsHistoryRequest):
+        check_batch_size(request_data.ids)
+        if request_data.window is not None and request_data.window < 1:
+            raise HTTPException(status_code=400, detail="La fenêtre de moyenne mobile doit être positive")
+        try:
+            history = stats_store.history(request_data.ids, request_data.source, request_data.metric, request_data.start, request_data.end)
+            averages = None
+            if request_data.window:
+                averages = stats_store.moving_average(request_data.ids, request_data.source, request_data.metric,
+                                                      request_data.window, request_data.start, request_data.end)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Date invalide : {str(e)}")
+
+        results = {}
+        for artist_id, (days, values) in history.items():
+            results[artist_id] = {
+                "dates": [from_day(day) for day in days],
+                "values": values.tolist()
+            }
+            if averages is not None:
+                results[artist_id]["moving_average"] = averages[artist_id][1].tolist()
+        return {"source": request_data.source, "metric": request_data.metric, "results": results}
+
+    @app.post('/api/artists/stats/growth')
+    async def get_artists_stats_growth(request_data: StatsGrowthRequest):
+        check_batch_size(request_data.ids)
+        try:
+            growth = stats_store.growth(request_data.ids, request_data.source, request_data.metric, request_data.days)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=str(e.args[0]))
+        return {"source": request_data.source, "metric": request_data.metric, "days": request_data.days, "results": growth}
+
     # Ajoutez d'autres routes selon vos besoins
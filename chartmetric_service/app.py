@@ -1,4 +1,7 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import List, Optional
 import os
@@ -6,7 +9,14 @@ from dotenv import load_dotenv
 import logging
 from auth.chartmetric_auth import ChartmetricAuth
 from cache.cache_manager import CacheManager
+from cache.sqlite_backend import SQLiteCacheBackend
 from client.chartmetric_client import ChartmetricClient
+from client.rate_limiter import RateLimiter
+from client.roster_sync import RosterSync
+from store.stats_store import StatsStore
+from store.artist_index import ArtistNameIndex
+from monitoring.metrics import PrometheusWriter, UpstreamMetrics
+from api.routes import register_routes
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -18,12 +28,82 @@ if not chartmetric_refresh_token:
     logger.critical("CHARTMETRIC_REFRESH_TOKEN manquant")
     raise ValueError("CHARTMETRIC_REFRESH_TOKEN manquant")
 
-app = FastAPI(title="Chartmetric Service", version="1.0.0")
+# Cache persistant (SQLite) pour conserver le cache d'un redémarrage à l'autre ; désactivé si CACHE_DB_PATH est vide
+cache_db_path = os.getenv("CACHE_DB_PATH", "data/chartmetric_cache.db")
+# Initialisation avec le TTL par défaut de 3600 secondes (1 heure) et un budget mémoire borné
+cache_manager = CacheManager(
+    default_ttl=int(os.getenv("CACHE_DEFAULT_TTL", "3600")),
+    max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    backend=SQLiteCacheBackend(cache_db_path) if cache_db_path else None
+)
+# Limiteur de débit commun à tous les appels Chartmetric du processus (à répartir entre les workers)
+rate_limiter = RateLimiter(
+    rate=float(os.getenv("CHARTMETRIC_RATE_LIMIT", "2")),
+    burst=int(os.getenv("CHARTMETRIC_RATE_BURST", "5"))
+)
+# Latence et statut des appels à Chartmetric, exposés sur /metrics
+upstream_metrics = UpstreamMetrics()
+auth_manager = ChartmetricAuth(chartmetric_refresh_token, rate_limiter=rate_limiter, upstream_metrics=upstream_metrics)
+# Historique des statistiques d'artistes, alimenté par chaque réponse /stat de Chartmetric
+stats_store = StatsStore(os.getenv("STATS_STORE_DIR", "data/stats_store"))
+STATS_STORE_FLUSH_INTERVAL = int(os.getenv("STATS_STORE_FLUSH_INTERVAL", "300"))
+# Résolution locale des noms d'artistes (index des recherches passées, entrées négatives comprises) ;
+# les noms approchants ne servent qu'aux suggestions (/api/artists/suggest)
+artist_index = ArtistNameIndex(
+    negative_ttl=int(os.getenv("ARTIST_NEGATIVE_TTL", str(6 * 3600))),
+    fuzzy_threshold=float(os.getenv("ARTIST_FUZZY_THRESHOLD", "0.55")),
+    positive_ttl=int(os.getenv("ARTIST_NAME_TTL", str(7 * 86400)))
+)
+chartmetric_client = ChartmetricClient(auth_manager, cache_manager, rate_limiter, stats_store, artist_index, upstream_metrics)
+# Artistes suivis (fichier JSON et/ou liste de noms), tenus à jour en arrière-plan par un
+# seul worker (verrou ROSTER_LOCK_FILE) ; les autres lisent ses rafraîchissements dans le
+# cache persistant, d'où la nécessité de CACHE_DB_PATH pour en profiter dans tous les workers
+roster_sync = RosterSync(
+    chartmetric_client,
+    cache_manager,
+    roster_path=os.getenv("ROSTER_FILE"),
+    names=[name for name in os.getenv("ROSTER_ARTISTS", "").split(",") if name.strip()],
+    sources=[source.strip() for source in os.getenv("ROSTER_SOURCES", "spotify").split(",") if source.strip()],
+    interval=int(os.getenv("ROSTER_SYNC_INTERVAL", "120")),
+    batch_size=int(os.getenv("ROSTER_SYNC_BATCH_SIZE", "10")),
+    lock_path=os.getenv("ROSTER_LOCK_FILE", "data/roster_sync.lock") or None
+)
 
-# Initialisation avec le TTL par défaut de 3600 secondes (1 heure)
-cache_manager = CacheManager(default_ttl=3600)
-auth_manager = ChartmetricAuth(chartmetric_refresh_token)
-chartmetric_client = ChartmetricClient(auth_manager, cache_manager)
+async def save_stats_store():
+    readings = stats_store.take_unsaved()
+    try:
+        await asyncio.to_thread(stats_store.save, readings)
+    except OSError:
+        stats_store.restore_unsaved(readings)
+        raise
+
+async def flush_stats_store():
+    while True:
+        await asyncio.sleep(STATS_STORE_FLUSH_INTERVAL)
+        try:
+            await save_stats_store()
+        except OSError as e:
+            logger.error(f"Erreur lors de la sauvegarde de l'historique des statistiques : {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app):
+    cache_manager.warm(int(os.getenv("CACHE_WARM_ENTRIES", "5000")))
+    # Une seule session HTTP (connexions réutilisées) pour toute la durée de vie du service
+    await chartmetric_client.start()
+    stats_store.load()
+    flush_task = asyncio.ensure_future(flush_stats_store())
+    roster_sync.start()
+    try:
+        yield
+    finally:
+        await roster_sync.stop()
+        flush_task.cancel()
+        await save_stats_store()
+        await chartmetric_client.close()
+        await asyncio.to_thread(cache_manager.close)
+
+app = FastAPI(title="Chartmetric Service", version="1.0.0", lifespan=lifespan)
+register_routes(app, chartmetric_client, stats_store)
 
 # Définir un modèle de données pour la requête
 class TrendsRequest(BaseModel):
@@ -38,6 +118,56 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.get('/stats')
+async def stats():
+    return {
+        "cache": cache_manager.snapshot(),
+        "rate_limiter": rate_limiter.snapshot(),
+        "stats_store": stats_store.snapshot(),
+        "artist_index": artist_index.snapshot(),
+        "roster": roster_sync.snapshot()
+    }
+
+@app.get('/metrics')
+async def metrics():
+    """Métriques du service au format texte Prometheus."""
+    writer = PrometheusWriter()
+    cache = cache_manager.stats
+    writer.metric("chartmetric_cache_hits_total", "counter", "Lectures du cache servies", [({}, cache["hits"])])
+    writer.metric("chartmetric_cache_misses_total", "counter", "Lectures du cache sans entrée valide", [({}, cache["misses"])])
+    writer.metric("chartmetric_cache_backend_hits_total", "counter", "Lectures servies par le cache persistant (entrées d'autres workers)", [({}, cache["backend_hits"])])
+    writer.metric("chartmetric_cache_evictions_total", "counter", "Entrées évincées pour respecter le budget mémoire", [({}, cache["evictions"])])
+    writer.metric("chartmetric_cache_expirations_total", "counter", "Entrées supprimées à expiration", [({}, cache["expirations"])])
+    writer.metric("chartmetric_cache_entries", "gauge", "Entrées en mémoire", [({}, len(cache_manager.cache))])
+    writer.metric("chartmetric_cache_bytes", "gauge", "Taille approximative du cache en octets", [({}, cache_manager.current_bytes)])
+
+    writer.histogram("chartmetric_upstream_request_duration_seconds", "Latence des appels à Chartmetric par endpoint",
+                     [({"endpoint": endpoint}, histogram) for endpoint, histogram in upstream_metrics.latency.items()])
+    writer.metric("chartmetric_upstream_responses_total", "counter", "Réponses de Chartmetric par endpoint et statut",
+                  [({"endpoint": endpoint, "status": status}, count) for (endpoint, status), count in upstream_metrics.responses.items()])
+
+    writer.metric("chartmetric_token_refreshes_total", "counter", "Renouvellements du token Chartmetric réussis", [({}, auth_manager.refresh_count)])
+    writer.metric("chartmetric_token_refresh_errors_total", "counter", "Renouvellements du token Chartmetric en échec", [({}, auth_manager.refresh_errors)])
+
+    limiter = rate_limiter.snapshot()
+    writer.metric("chartmetric_rate_limiter_queue_depth", "gauge", "Requêtes en attente d'un jeton", [({}, limiter["queue_depth"])])
+    writer.metric("chartmetric_rate_limiter_throttled_total", "counter", "Réponses 429 reçues", [({}, limiter["throttled"])])
+    writer.metric("chartmetric_rate_limiter_wait_seconds_total", "counter", "Temps total d'attente d'un jeton par priorité",
+                  [({"priority": name}, stats["wait_seconds_total"]) for name, stats in limiter["priorities"].items()])
+    writer.metric("chartmetric_rate_limiter_acquired_total", "counter", "Jetons obtenus par priorité",
+                  [({"priority": name}, stats["acquired"]) for name, stats in limiter["priorities"].items()])
+
+    index = artist_index.stats
+    writer.metric("chartmetric_artist_index_resolutions_total", "counter", "Résolutions de noms d'artistes par résultat",
+                  [({"result": result}, index[result]) for result in ("exact_hits", "negative_hits", "misses")])
+
+    roster = roster_sync.stats
+    writer.metric("chartmetric_roster_sync_leader", "gauge", "1 si ce worker synchronise le roster", [({}, int(roster_sync.leader))])
+    writer.metric("chartmetric_roster_tracked_artists", "gauge", "Artistes suivis", [({}, len(roster_sync.roster))])
+    writer.metric("chartmetric_roster_refreshes_total", "counter", "Rafraîchissements du roster par résultat",
+                  [({"result": "ok"}, roster["refreshed"]), ({"result": "error"}, roster["errors"])])
+    return Response(writer.render(), media_type=PrometheusWriter.CONTENT_TYPE)
+
 @app.post('/trends')
 async def get_trends(request_data: dict):
     try:
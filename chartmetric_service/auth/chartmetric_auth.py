@@ -1,3 +1,4 @@
+import asyncio
 import time
 import logging
 import aiohttp
@@ -8,40 +9,107 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 class ChartmetricAuth:
-    def __init__(self, refresh_token=None):
+    def __init__(self, refresh_token=None, rate_limiter=None, refresh_margin=300, upstream_metrics=None):
+        """
+        Args:
+            refresh_token (str): Refresh token Chartmetric
+            rate_limiter (RateLimiter, optional): Limiteur de débit partagé avec le client
+            refresh_margin (int): Le token est renouvelé en arrière-plan ce nombre de secondes avant expiration
+            upstream_metrics (UpstreamMetrics, optional): Enregistre la latence des appels /token
+        """
         self.refresh_token = refresh_token or os.getenv("CHARTMETRIC_REFRESH_TOKEN")
         if not self.refresh_token:
             raise ValueError("Refresh token Chartmetric non fourni")
         self.base_url = os.getenv("CHARTMETRIC_API_BASE_URL", "https://api.chartmetric.com/api")
+        self.rate_limiter = rate_limiter
+        self.refresh_margin = refresh_margin
+        self.upstream_metrics = upstream_metrics
         self.access_token = None
         self.expires_at = 0
-        
+        self.refresh_count = 0
+        self.refresh_errors = 0
+        self._refresh_task = None
+        self._renewal_task = None
+
+    def _is_usable(self):
+        # Marge courte : le token reste utilisable pendant que le renouvellement d'arrière-plan s'exécute
+        return self.access_token is not None and time.time() < self.expires_at - 30
+
     async def get_access_token(self, session):
-        current_time = int(time.time())
-        if not self.access_token or current_time >= self.expires_at - 300:
-            logger.info("Access token expiré ou non existant, renouvellement...")
-            await self.refresh_access_token(session)
-        return self.access_token
-        
+        if self._is_usable():
+            return self.access_token
+        logger.info("Access token expiré ou non existant, renouvellement...")
+        return await self._refresh_once(session)
+
+    async def _refresh_once(self, session):
+        """
+        Renouvelle le token en un seul appel, quel que soit le nombre de coroutines
+        concurrentes : la première lance le renouvellement, les autres attendent son résultat.
+        """
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.ensure_future(self.refresh_access_token(session))
+        # shield : l'annulation d'une requête n'interrompt pas le renouvellement partagé
+        return await asyncio.shield(self._refresh_task)
+
     async def refresh_access_token(self, session):
         url = f"{self.base_url}/token"
         data = {"refreshtoken": self.refresh_token}
         headers = {"Content-Type": "application/json"}
         try:
             logger.debug(f"Demande d'un nouveau access token à {url}")
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            start = time.perf_counter()
             async with session.post(url, json=data, headers=headers) as response:
+                if self.upstream_metrics is not None:
+                    self.upstream_metrics.observe("/token", str(response.status), time.perf_counter() - start)
                 response.raise_for_status()
                 result = await response.json()
-                self.access_token = result.get("token")
-                expires_in = result.get("expires_in", 3600)
-                self.expires_at = int(time.time()) + expires_in
-                if not self.access_token:
+                access_token = result.get("token")
+                if not access_token:
                     raise ValueError("Access token non trouvé dans la réponse Chartmetric")
+                self.access_token = access_token
+                self.expires_at = int(time.time()) + result.get("expires_in", 3600)
+                self.refresh_count += 1
                 logger.info(f"Nouveau access token obtenu, valide jusqu'à {time.ctime(self.expires_at)}")
                 return self.access_token
         except aiohttp.ClientResponseError as e:
+            self.refresh_errors += 1
             logger.error(f"Erreur HTTP lors de l'obtention de l'access token: {e.status} - {e.message}")
             raise
         except Exception as e:
+            self.refresh_errors += 1
             logger.error(f"Erreur lors de l'obtention de l'access token: {str(e)}")
             raise
+
+    def start(self, session):
+        """Lance le renouvellement du token en arrière-plan, avant l'expiration."""
+        if self._renewal_task is None or self._renewal_task.done():
+            self._renewal_task = asyncio.ensure_future(self._renewal_loop(session))
+
+    async def stop(self):
+        if self._renewal_task is not None:
+            self._renewal_task.cancel()
+            try:
+                await self._renewal_task
+            except asyncio.CancelledError:
+                pass
+            self._renewal_task = None
+
+    async def _renewal_loop(self, session):
+        retry_delay = 5
+        while True:
+            remaining = self.expires_at - time.time()
+            # Pour un token de courte durée, on renouvelle au plus tôt à mi-vie
+            delay = max(remaining - self.refresh_margin, remaining / 2)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self._refresh_once(session)
+                retry_delay = 5
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Nouvel essai avec attente croissante ; les requêtes gardent le token courant tant qu'il est valide
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60)
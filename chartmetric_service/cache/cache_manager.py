@@ -1,76 +1,179 @@
-from cachetools import TTLCache
+import asyncio
+import heapq
+import json
 import logging
+import sys
+import time
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# Surcoût approximatif d'une entrée (dictionnaires internes, tuple, heap), en octets
+ENTRY_OVERHEAD = 200
+
+def estimate_size(key, value):
+    """
+    Estime la taille mémoire d'une entrée en octets.
+
+    Les valeurs mises en cache sont des réponses JSON : la taille de leur
+    sérialisation donne un ordre de grandeur suffisant pour le budget mémoire.
+    """
+    try:
+        value_size = len(json.dumps(value, ensure_ascii=False, default=str))
+    except (TypeError, ValueError):
+        value_size = sys.getsizeof(value)
+    return len(str(key)) + value_size + ENTRY_OVERHEAD
+
 class CacheManager:
-    def __init__(self, default_ttl=3600, maxsize=1000):
+    def __init__(self, default_ttl=3600, max_bytes=64 * 1024 * 1024, maxsize=None, backend=None):
         """
-        Initialise le gestionnaire de cache avec un TTL par défaut et une taille maximale.
-        
+        Initialise le gestionnaire de cache avec un TTL par défaut et un budget mémoire.
+
+        Chaque entrée a sa propre date d'expiration, suivie dans un tas (heap) :
+        les entrées expirées sont purgées dans l'ordre de leur échéance. Quand
+        le budget mémoire est dépassé, les entrées les moins récemment utilisées
+        sont évincées.
+
         Args:
             default_ttl (int): Durée de vie par défaut des entrées en secondes (3600s = 1h par défaut)
-            maxsize (int): Nombre maximum d'entrées dans le cache (1000 par défaut)
+            max_bytes (int): Taille totale approximative maximale du cache en octets (64 Mo par défaut)
+            maxsize (int, optional): Nombre maximum d'entrées, sans limite si None
+            backend (optional): Stockage persistant (ex. SQLiteCacheBackend) recevant
+                                les écritures, rechargé au démarrage par warm() et
+                                consulté par load/load_many
         """
         self.default_ttl = default_ttl
-        self.cache = TTLCache(maxsize=maxsize, ttl=default_ttl)
-        logger.info(f"Cache initialisé avec TTL par défaut de {default_ttl}s et taille max de {maxsize}")
+        self.max_bytes = max_bytes
+        self.maxsize = maxsize
+        self.backend = backend
+        # Clés jamais évincées pour le budget mémoire (ex. artistes suivis), elles expirent normalement
+        self.pinned = set()
+        # clé -> (valeur, expiration, taille), dans l'ordre d'utilisation (LRU en tête)
+        self.cache = OrderedDict()
+        self._expiry_heap = []
+        self.current_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "backend_hits": 0, "expirations": 0, "evictions": 0}
+        logger.info(f"Cache initialisé avec TTL par défaut de {default_ttl}s et budget de {max_bytes} octets")
 
     def get(self, key):
         """
-        Récupère une valeur du cache par sa clé.
-        
+        Récupère une valeur du cache en mémoire par sa clé.
+
         Args:
             key (str): Clé de l'entrée à récupérer
-            
+
         Returns:
-            La valeur associée à la clé ou None si la clé n'existe pas
+            La valeur associée à la clé ou None si la clé n'existe pas ou a expiré
         """
-        value = self.cache.get(key)
-        if value is not None:
-            logger.debug(f"Cache hit pour la clé: {key}")
-        else:
-            logger.debug(f"Cache miss pour la clé: {key}")
+        value = self._lookup(key)
+        if value is None:
+            self.stats["misses"] += 1
+            logger.debug("Cache miss pour la clé: %s", key)
         return value
 
+    async def load(self, key):
+        """
+        Comme get, mais en l'absence d'entrée valide en mémoire, consulte le
+        stockage persistant (voir load_many).
+        """
+        return (await self.load_many([key])).get(key)
+
+    async def load_many(self, keys):
+        """
+        Récupère plusieurs valeurs : celles en mémoire directement, les autres
+        depuis le stockage persistant, qui contient les entrées écrites par les
+        autres workers (par exemple les rafraîchissements du roster). La lecture
+        SQLite, une seule requête pour toutes les clés absentes, s'exécute dans
+        un thread pour ne pas bloquer la boucle d'événements.
+
+        Returns:
+            dict: clé -> valeur, pour les clés trouvées uniquement
+        """
+        results = {}
+        absent = []
+        for key in keys:
+            value = self._lookup(key)
+            if value is not None:
+                results[key] = value
+            else:
+                absent.append(key)
+
+        if absent and self.backend is not None:
+            stored = await asyncio.to_thread(self.backend.read_many, absent)
+            now = time.time()
+            for key, (value, expires_at) in stored.items():
+                self._store(key, value, expires_at - now)
+                results[key] = value
+                logger.debug("Entrée rechargée depuis le cache persistant pour la clé: %s", key)
+            self.stats["backend_hits"] += len(stored)
+            absent = [key for key in absent if key not in stored]
+
+        self.stats["misses"] += len(absent)
+        return results
+
+    def _lookup(self, key):
+        """Valeur valide en mémoire (comptée comme hit), ou None."""
+        entry = self.cache.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            self.stats["expirations"] += 1
+            entry = None
+        if entry is None:
+            return None
+        self.cache.move_to_end(key)
+        self.stats["hits"] += 1
+        if self.backend is not None:
+            self.backend.record_hit(key)
+        logger.debug("Cache hit pour la clé: %s", key)
+        return entry[0]
+
     def set(self, key, value, ttl=None):
         """
         Stocke une valeur dans le cache avec une clé spécifique.
-        
+
         Args:
             key (str): Clé pour stocker la valeur
             value: Valeur à stocker
             ttl (int, optional): Durée de vie spécifique pour cette entrée.
                                 Si None, utilise le TTL par défaut.
         """
-        # Si un TTL spécifique est fourni, nous devons créer un cache temporaire
-        if ttl is not None and ttl != self.default_ttl:
-            # Créer un cache temporaire avec le TTL spécifié
-            temp_cache = TTLCache(maxsize=1, ttl=ttl)
-            temp_cache[key] = value
-            # Copier l'entrée dans le cache principal
-            self.cache[key] = value
-            logger.debug(f"Valeur mise en cache pour la clé: {key} avec TTL personnalisé: {ttl}s")
-        else:
-            # Utiliser le cache principal avec le TTL par défaut
-            self.cache[key] = value
-            logger.debug(f"Valeur mise en cache pour la clé: {key} avec TTL par défaut: {self.default_ttl}s")
+        ttl = self.default_ttl if ttl is None else ttl
+        if self.backend is not None:
+            self.backend.write(key, value, time.time() + ttl)
+        self._store(key, value, ttl)
+
+    def _store(self, key, value, ttl):
+        size = estimate_size(key, value)
+        if key in self.cache:
+            self._remove(key)
+        if size > self.max_bytes:
+            logger.warning(f"Entrée trop volumineuse pour le cache ({size} octets), non stockée : {key}")
+            return
+
+        expires_at = time.monotonic() + ttl
+        self.cache[key] = (value, expires_at, size)
+        self.current_bytes += size
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        logger.debug("Valeur mise en cache pour la clé: %s avec TTL: %ss", key, ttl)
+        self._enforce_limits()
 
     def delete(self, key):
         """
         Supprime une entrée du cache.
-        
+
         Args:
             key (str): Clé de l'entrée à supprimer
-            
+
         Returns:
             bool: True si la clé existait et a été supprimée, False sinon
         """
+        if self.backend is not None:
+            self.backend.delete(key)
         if key in self.cache:
-            del self.cache[key]
-            logger.debug(f"Entrée supprimée du cache pour la clé: {key}")
+            self._remove(key)
+            logger.debug("Entrée supprimée du cache pour la clé: %s", key)
             return True
-        logger.debug(f"Tentative de suppression d'une clé inexistante: {key}")
+        logger.debug("Tentative de suppression d'une clé inexistante: %s", key)
         return False
 
     def clear(self):
@@ -78,4 +181,109 @@ class CacheManager:
         Vide complètement le cache.
         """
         self.cache.clear()
+        self._expiry_heap.clear()
+        self.current_bytes = 0
+        if self.backend is not None:
+            self.backend.clear()
         logger.info("Cache entièrement vidé")
+
+    def ttl_remaining(self, key):
+        """
+        Durée de vie restante d'une entrée, en secondes, sans la compter comme une lecture.
+
+        Returns:
+            float | None: Secondes avant expiration, ou None si l'entrée est absente ou expirée
+        """
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        remaining = entry[1] - time.monotonic()
+        return remaining if remaining > 0 else None
+
+    def warm(self, limit=5000):
+        """
+        Recharge depuis le stockage persistant les entrées valides les plus
+        demandées, dans la limite du budget mémoire.
+
+        Returns:
+            int: Nombre d'entrées rechargées
+        """
+        if self.backend is None:
+            return 0
+        entries = self.backend.load_hot(limit)
+        budget = self.max_bytes - self.current_bytes
+        selected = []
+        for key, value, expires_at in entries:
+            size = estimate_size(key, value)
+            if size > budget:
+                break
+            budget -= size
+            selected.append((key, value, expires_at))
+        # Insertion des moins demandées d'abord : les plus demandées sont les dernières évincées
+        now = time.time()
+        for key, value, expires_at in reversed(selected):
+            self._store(key, value, expires_at - now)
+        logger.info(f"Cache préchauffé avec {len(selected)} entrées persistées")
+        return len(selected)
+
+    def close(self):
+        if self.backend is not None:
+            self.backend.close()
+
+    def purge_expired(self):
+        """
+        Supprime les entrées expirées, dans l'ordre de leur échéance.
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        now = time.monotonic()
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self.cache.get(key)
+            # Les éléments du tas périmés (clé réécrite ou supprimée depuis) sont ignorés
+            if entry is not None and entry[1] == expires_at:
+                self._remove(key, pop_heap=False)
+                removed += 1
+        self.stats["expirations"] += removed
+        return removed
+
+    def snapshot(self):
+        snapshot = {
+            **self.stats,
+            "entries": len(self.cache),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes
+        }
+        if self.backend is not None:
+            snapshot["backend"] = self.backend.snapshot()
+        return snapshot
+
+    def _remove(self, key, pop_heap=True):
+        _, _, size = self.cache.pop(key)
+        self.current_bytes -= size
+        # L'élément correspondant du tas reste en place et sera ignoré ; on compacte
+        # le tas quand il contient trop d'éléments périmés
+        if pop_heap and len(self._expiry_heap) > 2 * len(self.cache) + 64:
+            self._expiry_heap = [(expires_at, k) for expires_at, k in self._expiry_heap
+                                 if k in self.cache and self.cache[k][1] == expires_at]
+            heapq.heapify(self._expiry_heap)
+
+    def _enforce_limits(self):
+        if not self._over_limits():
+            return
+        self.purge_expired()
+        skipped = 0
+        while self._over_limits() and skipped < len(self.cache):
+            key = next(iter(self.cache))
+            if key in self.pinned:
+                self.cache.move_to_end(key)
+                skipped += 1
+                continue
+            self._remove(key)
+            self.stats["evictions"] += 1
+            logger.debug("Entrée évincée du cache (budget mémoire): %s", key)
+
+    def _over_limits(self):
+        return self.current_bytes > self.max_bytes or (self.maxsize is not None and len(self.cache) > self.maxsize)
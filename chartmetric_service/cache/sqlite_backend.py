@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+)
+"""
+
+_STOP = object()
+
+# Nombre maximum de clés par requête de lecture (limite de paramètres SQLite)
+READ_CHUNK = 500
+
+class SQLiteCacheBackend:
+    """
+    Stockage persistant du CacheManager dans une base SQLite en mode WAL.
+
+    Les écritures sont mises en file et appliquées par un thread dédié, par
+    lots dans une seule transaction : le chemin de la requête ne touche jamais
+    au disque. Les accès (hits) sont comptés en mémoire et reportés avec les
+    écritures, pour recharger en priorité les entrées les plus demandées au
+    démarrage. Plusieurs workers peuvent partager le même fichier.
+
+    Interface attendue par CacheManager : write, delete, clear, record_hit, read_many, load_hot, close.
+    """
+
+    def __init__(self, path, flush_interval=1.0, purge_interval=3600):
+        """
+        Args:
+            path (str): Chemin du fichier SQLite
+            flush_interval (float): Délai maximum avant l'application des écritures en attente, en secondes
+            purge_interval (int): Intervalle de suppression des entrées expirées, en secondes
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.purge_interval = purge_interval
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+        self._queue = queue.Queue()
+        self._hits = Counter()
+        self._hits_lock = threading.Lock()
+        # Connexion de lecture partagée par les threads de lecture (voir read_many)
+        self._reader = None
+        self._read_lock = threading.Lock()
+        self.stats = {"writes": 0, "write_errors": 0, "loaded": 0, "reads": 0, "read_hits": 0}
+        self._thread = threading.Thread(target=self._run, name="cache-writer", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def write(self, key, value, expires_at):
+        """Planifie l'écriture d'une entrée (expires_at en temps epoch)."""
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            logger.debug("Valeur non sérialisable, non persistée pour la clé: %s", key)
+            return
+        self._queue.put(("write", key, payload, expires_at))
+
+    def delete(self, key):
+        self._queue.put(("delete", key))
+
+    def clear(self):
+        self._queue.put(("clear",))
+
+    def record_hit(self, key):
+        with self._hits_lock:
+            self._hits[key] += 1
+
+    def read(self, key):
+        """
+        Lit une entrée encore valide, écrite par ce processus ou par un autre worker.
+
+        Returns:
+            tuple | None: (valeur, expiration en temps epoch), ou None si absente ou expirée
+        """
+        return self.read_many([key]).get(key)
+
+    def read_many(self, keys):
+        """
+        Lit plusieurs entrées encore valides. Appel bloquant : CacheManager
+        l'exécute dans un thread (asyncio.to_thread), hors de la boucle d'événements.
+
+        Returns:
+            dict: clé -> (valeur, expiration en temps epoch), pour les entrées trouvées
+        """
+        keys = list(keys)
+        rows = []
+        with self._read_lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            self.stats["reads"] += len(keys)
+            now = time.time()
+            try:
+                for i in range(0, len(keys), READ_CHUNK):
+                    chunk = keys[i:i + READ_CHUNK]
+                    rows.extend(self._reader.execute(
+                        "SELECT key, value, expires_at FROM entries WHERE key IN (%s) AND expires_at > ?"
+                        % ",".join("?" * len(chunk)),
+                        (*chunk, now)
+                    ).fetchall())
+            except sqlite3.Error as e:
+                logger.error(f"Erreur de lecture du cache persistant : {str(e)}")
+                return {}
+            entries = {}
+            for key, value, expires_at in rows:
+                try:
+                    entries[key] = (json.loads(value), expires_at)
+                except ValueError:
+                    continue
+            self.stats["read_hits"] += len(entries)
+        return entries
+
+    def load_hot(self, limit):
+        """
+        Renvoie les entrées encore valides, les plus demandées en premier.
+
+        Returns:
+            list: Tuples (clé, valeur, expiration en temps epoch)
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT key, value, expires_at FROM entries WHERE expires_at > ? "
+                "ORDER BY hits DESC, updated_at DESC LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        entries = []
+        for key, payload, expires_at in rows:
+            try:
+                entries.append((key, json.loads(payload), expires_at))
+            except ValueError:
+                continue
+        self.stats["loaded"] = len(entries)
+        return entries
+
+    def close(self):
+        """Applique les écritures en attente puis arrête le thread d'écriture."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout=10)
+        with self._read_lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _run(self):
+        connection = self._connect()
+        next_purge = time.monotonic()
+        try:
+            while True:
+                try:
+                    operations = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    operations = []
+                # Regroupe tout ce qui est déjà en file dans la même transaction
+                while True:
+                    try:
+                        operations.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stop = _STOP in operations
+                operations = [operation for operation in operations if operation is not _STOP]
+
+                with self._hits_lock:
+                    hits, self._hits = self._hits, Counter()
+                purge = time.monotonic() >= next_purge
+                if operations or hits or purge:
+                    try:
+                        self._apply(connection, operations, hits, purge)
+                        self.stats["writes"] += len(operations)
+                    except sqlite3.Error as e:
+                        self.stats["write_errors"] += len(operations)
+                        logger.error(f"Erreur d'écriture dans le cache persistant : {str(e)}")
+                    if purge:
+                        next_purge = time.monotonic() + self.purge_interval
+                if stop:
+                    return
+        finally:
+            connection.close()
+
+    def _apply(self, connection, operations, hits, purge):
+        now = time.time()
+        with connection:
+            for operation in operations:
+                if operation[0] == "write":
+                    _, key, payload, expires_at = operation
+                    connection.execute(
+                        "INSERT INTO entries (key, value, expires_at, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                        "expires_at = excluded.expires_at, updated_at = excluded.updated_at",
+                        (key, payload, expires_at, now)
+                    )
+                elif operation[0] == "delete":
+                    connection.execute("DELETE FROM entries WHERE key = ?", (operation[1],))
+                elif operation[0] == "clear":
+                    connection.execute("DELETE FROM entries")
+            if hits:
+                connection.executemany("UPDATE entries SET hits = hits + ? WHERE key = ?",
+                                       [(count, key) for key, count in hits.items()])
+            if purge:
+                connection.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    def snapshot(self):
+        return {**self.stats, "pending": self._queue.qsize()}
@@ -1,68 +1,227 @@
+import asyncio
 import aiohttp
 import logging
+import os
+import time
 import urllib.parse
+from client.rate_limiter import INTERACTIVE, parse_retry_after
+from monitoring.metrics import UpstreamMetrics
 
-logger = logging.getLogger(__name__) 
+logger = logging.getLogger(__name__)
+
+# Durées de vie en cache selon le type de donnée, en secondes : les résultats de
+# recherche et les artistes similaires changent peu, contrairement aux statistiques
+SEARCH_TTL = int(os.getenv("CACHE_TTL_SEARCH", str(7 * 86400)))
+SIMILAR_TTL = int(os.getenv("CACHE_TTL_SIMILAR", "86400"))
+ARTIST_TTL = int(os.getenv("CACHE_TTL_ARTIST", "86400"))
+STATS_TTL = int(os.getenv("CACHE_TTL_STATS", "900"))
+
+# Nouvelles tentatives après une réponse 429, une fois le délai Retry-After écoulé
+RATE_LIMIT_RETRIES = int(os.getenv("CHARTMETRIC_RATE_LIMIT_RETRIES", "2"))
 
 class ChartmetricClient:
-    def __init__(self, auth_manager, cache_manager):
+    def __init__(self, auth_manager, cache_manager, rate_limiter, stats_store=None, artist_index=None,
+                 upstream_metrics=None, base_url=None):
         self.auth_manager = auth_manager
         self.cache_manager = cache_manager
-    
-    async def search_artist(self, artist_name):
-        """Recherche un artiste par son nom"""
+        self.rate_limiter = rate_limiter
+        self.stats_store = stats_store
+        self.artist_index = artist_index
+        self.upstream_metrics = upstream_metrics or UpstreamMetrics()
+        self.base_url = base_url or os.getenv("CHARTMETRIC_API_BASE_URL", "https://api.chartmetric.com/api")
+        self.session = None
+
+    async def start(self):
+        """
+        Crée la session HTTP partagée par toutes les requêtes vers Chartmetric,
+        y compris le renouvellement du token. À appeler au démarrage du service.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=int(os.getenv("CHARTMETRIC_MAX_CONNECTIONS", "50")),
+            limit_per_host=int(os.getenv("CHARTMETRIC_MAX_CONNECTIONS_PER_HOST", "20")),
+            ttl_dns_cache=300,
+            keepalive_timeout=60
+        )
+        timeout = aiohttp.ClientTimeout(total=float(os.getenv("CHARTMETRIC_TIMEOUT", "10")))
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self.auth_manager.start(self.session)
+        logger.info("Session HTTP Chartmetric ouverte")
+
+    async def close(self):
+        """Ferme la session HTTP partagée. À appeler à l'arrêt du service."""
+        await self.auth_manager.stop()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+            logger.info("Session HTTP Chartmetric fermée")
+
+    async def _get(self, path, endpoint, priority=INTERACTIVE):
+        """
+        Requête GET authentifiée vers l'API Chartmetric, soumise au limiteur de débit.
+
+        Une réponse 429 suspend toutes les requêtes du processus pendant le délai
+        Retry-After, puis la requête est retentée. La latence de chaque appel est
+        enregistrée sous endpoint, le chemin avec ses paramètres génériques.
+
+        Returns:
+            dict: Réponse JSON, ou None si Chartmetric répond avec une erreur
+        """
+        if self.session is None:
+            raise RuntimeError("Session Chartmetric non initialisée, appeler start() au démarrage")
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            token = await self.auth_manager.get_access_token(self.session)
+            headers = {"Authorization": f"Bearer {token}"}
+            await self.rate_limiter.acquire(priority)
+            start = time.perf_counter()
+            status = "error"
+            try:
+                async with self.session.get(f"{self.base_url}{path}", headers=headers) as response:
+                    status = str(response.status)
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status == 429:
+                        self.rate_limiter.penalize(parse_retry_after(response.headers.get("Retry-After")))
+                        continue
+                    logger.warning("Chartmetric a répondu %s pour %s", response.status, path)
+                    return None
+            finally:
+                self.upstream_metrics.observe(endpoint, status, time.perf_counter() - start)
+        logger.error("Limite de débit Chartmetric toujours atteinte après %s tentatives pour %s", RATE_LIMIT_RETRIES + 1, path)
+        return None
+
+    async def search_artist(self, artist_name, priority=INTERACTIVE):
+        """
+        Recherche un artiste par son nom.
+
+        Les noms déjà rencontrés à l'identique, ou sans résultat récemment, sont
+        résolus par l'index local sans appel à Chartmetric.
+        """
         cache_key = f"search_artist_{artist_name}"
-        cached_result = self.cache_manager.get(cache_key)
-        if cached_result:
+        cached_result = await self.cache_manager.load(cache_key)
+        if cached_result is not None:
             return cached_result
-            
-        token = await self.auth_manager.get_token()
-        headers = {"Authorization": f"Bearer {token}"}
-        
+
+        if self.artist_index is not None:
+            resolved = self.artist_index.resolve(artist_name)
+            if resolved is not None:
+                return resolved
+
         # Encoder le nom de l'artiste pour l'URL
         encoded_artist_name = urllib.parse.quote(artist_name)
-        
-        url = f"https://api.chartmetric.com/api/artist/search?name={encoded_artist_name}"
-        
-        async with aiohttp.ClientSession()  as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    result = data.get('obj', {}).get('artists', [])
-                    self.cache_manager.set(cache_key, result)
-                    return result
-                else:
-                    return []
-    
-    async def get_similar_artists(self, artist_id):
+
+        data = await self._get(f"/artist/search?name={encoded_artist_name}", "/artist/search", priority)
+        if data is None:
+            return []
+        result = data.get('obj', {}).get('artists', [])
+        if self.artist_index is not None:
+            if result:
+                self.artist_index.add(result)
+            else:
+                self.artist_index.add_negative(artist_name)
+        if result:
+            self.cache_manager.set(cache_key, result, ttl=SEARCH_TTL)
+        return result
+
+    async def get_similar_artists(self, artist_id, priority=INTERACTIVE):
         """Obtient des artistes similaires à partir d'un ID d'artiste"""
-        cache_key = f"similar_artists_{artist_id}"
-        cached_result = self.cache_manager.get(cache_key)
-        if cached_result:
+        cached_result = await self.cache_manager.load(f"similar_artists_{artist_id}")
+        if cached_result is not None:
             return cached_result
-            
-        token = await self.auth_manager.get_token()
-        headers = {"Authorization": f"Bearer {token}"}
-        
-        url = f"https://api.chartmetric.com/api/artist/{artist_id}/similar"
-        
-        async with aiohttp.ClientSession()  as session:
-            async with session.get(url, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    result = data.get('obj', [])
-                    self.cache_manager.set(cache_key, result)
-                    return result
-                else:
-                    return []
-    
+        result = await self._fetch_similar_artists(artist_id, priority)
+        return [] if result is None else result
+
+    async def _fetch_similar_artists(self, artist_id, priority=INTERACTIVE):
+        data = await self._get(f"/artist/{artist_id}/similar", "/artist/{id}/similar", priority)
+        if data is None:
+            return None
+        result = data.get('obj', [])
+        self.cache_manager.set(f"similar_artists_{artist_id}", result, ttl=SIMILAR_TTL)
+        return result
+
+    async def get_artist(self, artist_id, priority=INTERACTIVE):
+        """Obtient la fiche d'un artiste à partir de son ID"""
+        cached_result = await self.cache_manager.load(f"artist_{artist_id}")
+        if cached_result is not None:
+            return cached_result
+        return await self._fetch_artist(artist_id, priority)
+
+    async def _fetch_artist(self, artist_id, priority=INTERACTIVE):
+        data = await self._get(f"/artist/{artist_id}", "/artist/{id}", priority)
+        if data is None:
+            return None
+        result = data.get('obj', {})
+        self.cache_manager.set(f"artist_{artist_id}", result, ttl=ARTIST_TTL)
+        return result
+
+    async def get_artist_stats(self, artist_id, source="spotify", priority=INTERACTIVE):
+        """Obtient les statistiques d'un artiste sur une plateforme (spotify, youtube_channel, instagram...)"""
+        cached_result = await self.cache_manager.load(f"artist_stats_{artist_id}_{source}")
+        if cached_result is not None:
+            return cached_result
+        return await self._fetch_artist_stats(artist_id, source, priority)
+
+    async def _fetch_artist_stats(self, artist_id, source="spotify", priority=INTERACTIVE):
+        data = await self._get(f"/artist/{artist_id}/stat/{urllib.parse.quote(source)}", "/artist/{id}/stat/{source}", priority)
+        if data is None:
+            return None
+        result = data.get('obj', {})
+        self.cache_manager.set(f"artist_stats_{artist_id}_{source}", result, ttl=STATS_TTL)
+        if self.stats_store is not None:
+            self.stats_store.ingest(artist_id, source, result)
+        return result
+
+    async def get_artists_batch(self, artist_ids, priority=INTERACTIVE):
+        """Obtient les fiches de plusieurs artistes en un seul appel (voir _batch)"""
+        return await self._batch(
+            artist_ids,
+            lambda artist_id: f"artist_{artist_id}",
+            lambda artist_id: self._fetch_artist(artist_id, priority)
+        )
+
+    async def get_artists_stats_batch(self, artist_ids, source="spotify", priority=INTERACTIVE):
+        """Obtient les statistiques de plusieurs artistes en un seul appel (voir _batch)"""
+        return await self._batch(
+            artist_ids,
+            lambda artist_id: f"artist_stats_{artist_id}_{source}",
+            lambda artist_id: self._fetch_artist_stats(artist_id, source, priority)
+        )
+
+    async def _batch(self, artist_ids, cache_key, fetch):
+        """
+        Résout une liste d'IDs : doublons retirés, entrées en cache servies
+        directement, absentes récupérées en parallèle (le limiteur de débit
+        espace les appels vers Chartmetric).
+
+        Returns:
+            dict: results (ID -> données), missing (IDs introuvables ou en erreur),
+                  cache_hits et fetched (nombre d'appels à Chartmetric)
+        """
+        artist_ids = list(dict.fromkeys(artist_ids))
+        cached = await self.cache_manager.load_many([cache_key(artist_id) for artist_id in artist_ids])
+        results = {artist_id: cached[cache_key(artist_id)] for artist_id in artist_ids if cache_key(artist_id) in cached}
+        misses = [artist_id for artist_id in artist_ids if artist_id not in results]
+        cache_hits = len(results)
+
+        missing = []
+        fetched = await asyncio.gather(*(fetch(artist_id) for artist_id in misses), return_exceptions=True)
+        for artist_id, value in zip(misses, fetched):
+            if isinstance(value, Exception):
+                logger.error("Erreur lors de la récupération de l'artiste %s : %s", artist_id, value)
+                missing.append(artist_id)
+            elif value is None:
+                missing.append(artist_id)
+            else:
+                results[artist_id] = value
+
+        return {"results": results, "missing": missing, "cache_hits": cache_hits, "fetched": len(misses)}
+
     async def get_genre_trends(self, genre):
         """Obtient des tendances basées sur un genre musical"""
         cache_key = f"genre_trends_{genre}"
-        cached_result = self.cache_manager.get(cache_key)
-        if cached_result:
+        cached_result = await self.cache_manager.load(cache_key)
+        if cached_result is not None:
             return cached_result
-            
+
         # Liste de tendances par genre (fictives pour l'instant)
         genre_trends = {
             "metal": ["Collaborations avec des orchestres symphoniques", "Retour aux racines thrash", "Thèmes environnementaux"],
@@ -70,7 +229,7 @@ class ChartmetricClient:
             "rock": ["Influences post-punk", "Collaborations cross-genre", "Thèmes sociaux engagés"],
             "pop": ["Sonorités rétro des années 80", "Collaborations avec des artistes urbains", "Clips TikTok-friendly"]
         }
-        
+
         result = genre_trends.get(genre.lower(), ["Tendance générique 1", "Tendance générique 2", "Tendance générique 3"])
         self.cache_manager.set(cache_key, result)
         return result
@@ -0,0 +1,138 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Classes de priorité : une valeur plus petite est servie en premier
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+def parse_retry_after(value, default=5.0):
+    """
+    Convertit un en-tête Retry-After (secondes ou date HTTP) en délai en secondes.
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
+
+class RateLimiter:
+    """
+    Limiteur de débit asynchrone (seau à jetons) partagé par tous les appels Chartmetric du processus.
+
+    Tant que des jetons sont disponibles et que personne n'attend, acquire()
+    rend la main immédiatement. Sinon la requête rejoint une file triée par
+    priorité puis par ordre d'arrivée : une recherche interactive passe devant
+    les rafraîchissements d'arrière-plan déjà en attente. Une réponse 429
+    suspend toute distribution de jetons jusqu'à l'échéance de Retry-After.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate (float): Jetons ajoutés par seconde (requêtes par seconde autorisées)
+            burst (int): Capacité du seau, c'est-à-dire la rafale maximale
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self.throttled = 0
+        self.stats = {
+            name: {"acquired": 0, "queued": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+
+    async def acquire(self, priority=INTERACTIVE):
+        """Attend un jeton ; les requêtes de plus haute priorité sont servies en premier."""
+        start = time.monotonic()
+        if not self._waiters and self._try_take(start):
+            self._record(priority, 0.0, queued=False)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        await future
+        self._record(priority, time.monotonic() - start, queued=True)
+
+    def penalize(self, retry_after):
+        """Suspend les requêtes pendant retry_after secondes après une réponse 429."""
+        self.throttled += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+        self.tokens = 0.0
+        logger.warning("Limite de débit Chartmetric atteinte, pause de %.1fs", retry_after)
+
+    async def _dispatch(self):
+        while True:
+            # Les attentes annulées (requête client abandonnée) sont retirées de la file
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                return
+            delay = self._delay(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.tokens -= 1
+            _, _, future = heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _try_take(self, now):
+        if now < self.blocked_until:
+            return False
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _delay(self, now):
+        """Secondes avant qu'un jeton soit disponible (0 s'il l'est déjà)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def _record(self, priority, waited, queued):
+        stats = self.stats[PRIORITY_NAMES.get(priority, "background")]
+        stats["acquired"] += 1
+        stats["queued"] += queued
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "queue_depth": sum(1 for _, _, future in self._waiters if not future.done()),
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self.blocked_until - now), 3),
+            "priorities": {
+                name: {**stats, "wait_seconds_avg": stats["wait_seconds_total"] / stats["acquired"] if stats["acquired"] else 0.0}
+                for name, stats in self.stats.items()
+            }
+        }
@@ -0,0 +1,214 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from client.chartmetric_client import ARTIST_TTL, SIMILAR_TTL, STATS_TTL
+from client.rate_limiter import BACKGROUND
+from store.artist_index import normalize_name
+
+logger = logging.getLogger(__name__)
+
+def parse_roster(entries):
+    """
+    Normalise une liste d'artistes suivis : noms ("Nightwish") ou fiches
+    ({"name": "Nightwish", "id": 1234}), l'ID évitant une recherche.
+    """
+    roster = []
+    for entry in entries:
+        if isinstance(entry, str) and entry.strip():
+            roster.append({"name": entry.strip(), "id": None})
+        elif isinstance(entry, dict) and (entry.get("name") or entry.get("id") is not None):
+            roster.append({"name": entry.get("name"), "id": entry.get("id")})
+    return roster
+
+class RosterSync:
+    """
+    Synchronisation en arrière-plan des artistes suivis (roster).
+
+    À chaque cycle, seules les données absentes du cache ou proches de
+    l'expiration (moins de refresh_ahead de leur durée de vie) sont
+    rafraîchies, par lots, en priorité BACKGROUND derrière le limiteur de
+    débit. Les clés du roster sont protégées de l'éviction : une campagne pour
+    un artiste suivi est servie depuis le cache sans attendre Chartmetric.
+
+    L'intervalle doit rester inférieur à refresh_ahead * la plus courte durée
+    de vie (statistiques) pour qu'aucune entrée n'expire entre deux cycles.
+
+    Avec plusieurs workers, seul celui qui détient le verrou lock_path
+    synchronise : le roster n'est récupéré qu'une fois par cycle, dans la limite
+    de débit d'un seul worker. Les autres lisent les entrées rafraîchies dans le
+    cache persistant partagé (SQLite) et retentent d'obtenir le verrou à chaque
+    cycle, pour prendre le relais si le worker synchronisant s'arrête.
+    """
+
+    def __init__(self, client, cache_manager, roster_path=None, names=(), sources=("spotify",),
+                 interval=120, batch_size=10, refresh_ahead=0.5, lock_path=None):
+        """
+        Args:
+            client (ChartmetricClient): Client utilisé pour les rafraîchissements
+            cache_manager (CacheManager): Cache dont les entrées du roster sont surveillées
+            roster_path (str, optional): Fichier JSON du roster, relu quand il change
+            names (iterable): Artistes suivis en plus du fichier (noms)
+            sources (iterable): Plateformes dont les statistiques sont synchronisées
+            interval (int): Secondes entre deux cycles
+            batch_size (int): Rafraîchissements lancés en parallèle
+            refresh_ahead (float): Part de la durée de vie restante en dessous de laquelle une entrée est rafraîchie
+            lock_path (str, optional): Fichier verrou désignant le worker qui synchronise ;
+                                       sans verrou, chaque processus synchronise
+        """
+        self.client = client
+        self.cache_manager = cache_manager
+        self.roster_path = roster_path
+        self.extra = parse_roster(names)
+        self.sources = tuple(sources)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.refresh_ahead = refresh_ahead
+        self.roster = list(self.extra)
+        self._roster_mtime = None
+        self._task = None
+        self.lock_path = lock_path
+        self._lock_file = None
+        self.stats = {"cycles": 0, "refreshed": 0, "errors": 0, "unresolved": 0,
+                      "last_sync_at": None, "last_sync_seconds": None, "last_stale": 0}
+
+    def load_roster(self):
+        """Relit le fichier du roster s'il a changé ; les IDs déjà résolus sont conservés."""
+        if not self.roster_path:
+            return False
+        try:
+            mtime = os.path.getmtime(self.roster_path)
+        except OSError:
+            return False
+        if mtime == self._roster_mtime:
+            return False
+        try:
+            with open(self.roster_path, encoding="utf-8") as f:
+                entries = parse_roster(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"Roster illisible ({self.roster_path}) : {str(e)}")
+            return False
+        resolved = {normalize_name(entry["name"]): entry["id"] for entry in self.roster if entry["name"] and entry["id"] is not None}
+        for entry in entries:
+            if entry["id"] is None and entry["name"]:
+                entry["id"] = resolved.get(normalize_name(entry["name"]))
+        self.roster = entries + self.extra
+        self._roster_mtime = mtime
+        logger.info(f"Roster chargé : {len(self.roster)} artistes suivis")
+        return True
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    @property
+    def leader(self):
+        """Vrai si ce processus est celui qui synchronise le roster."""
+        return self.lock_path is None or self._lock_file is not None
+
+    def _try_lead(self):
+        """Tente d'obtenir le verrou de synchronisation, sans attendre ; il est libéré à l'arrêt du processus."""
+        if self.leader:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"Synchronisation du roster assurée par ce worker (pid {os.getpid()})")
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if self._try_lead():
+                    await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur lors de la synchronisation du roster : {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def sync_once(self):
+        """Exécute un cycle : résolution des nouveaux noms puis rafraîchissement des entrées périmées."""
+        start = time.monotonic()
+        self.load_roster()
+        await self._resolve_ids()
+
+        artist_ids = list(dict.fromkeys(entry["id"] for entry in self.roster if entry["id"] is not None))
+        watched = self._watched_entries(artist_ids)
+        self.cache_manager.pinned = {key for key, _, _ in watched}
+
+        stale = [fetch for key, ttl, fetch in watched if self._is_stale(key, ttl)]
+        self.stats["last_stale"] = len(stale)
+        for i in range(0, len(stale), self.batch_size):
+            results = await asyncio.gather(*(fetch() for fetch in stale[i:i + self.batch_size]), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception) or result is None:
+                    self.stats["errors"] += 1
+                else:
+                    self.stats["refreshed"] += 1
+
+        self.stats["cycles"] += 1
+        self.stats["last_sync_at"] = time.time()
+        self.stats["last_sync_seconds"] = round(time.monotonic() - start, 3)
+        if stale:
+            logger.info("Roster synchronisé : %s entrées rafraîchies en %.1fs", len(stale), self.stats["last_sync_seconds"])
+
+    async def _resolve_ids(self):
+        unresolved = [entry for entry in self.roster if entry["id"] is None and entry["name"]]
+        for i in range(0, len(unresolved), self.batch_size):
+            batch = unresolved[i:i + self.batch_size]
+            results = await asyncio.gather(
+                *(self.client.search_artist(entry["name"], BACKGROUND) for entry in batch),
+                return_exceptions=True
+            )
+            for entry, artists in zip(batch, results):
+                if isinstance(artists, Exception) or not artists:
+                    continue
+                # L'ID est conservé pour toute la durée de vie du roster : seul un nom identique
+                # (après normalisation) est retenu, jamais le premier résultat approchant
+                key = normalize_name(entry["name"])
+                match = next((artist for artist in artists if normalize_name(artist.get("name", "")) == key), None)
+                if match is None:
+                    logger.warning("Artiste du roster sans correspondance exacte : %s", entry["name"])
+                    continue
+                entry["id"] = match.get("id")
+        self.stats["unresolved"] = sum(1 for entry in self.roster if entry["id"] is None)
+
+    def _watched_entries(self, artist_ids):
+        """Clés de cache suivies pour chaque artiste, avec leur durée de vie et leur rafraîchissement."""
+        entries = []
+        for artist_id in artist_ids:
+            entries.append((f"artist_{artist_id}", ARTIST_TTL,
+                            lambda artist_id=artist_id: self.client._fetch_artist(artist_id, BACKGROUND)))
+            entries.append((f"similar_artists_{artist_id}", SIMILAR_TTL,
+                            lambda artist_id=artist_id: self.client._fetch_similar_artists(artist_id, BACKGROUND)))
+            for source in self.sources:
+                entries.append((f"artist_stats_{artist_id}_{source}", STATS_TTL,
+                                lambda artist_id=artist_id, source=source: self.client._fetch_artist_stats(artist_id, source, BACKGROUND)))
+        return entries
+
+    def _is_stale(self, key, ttl):
+        remaining = self.cache_manager.ttl_remaining(key)
+        return remaining is None or remaining < ttl * self.refresh_ahead
+
+    def snapshot(self):
+        return {**self.stats, "tracked": len(self.roster), "leader": self.leader}
@@ -0,0 +1,82 @@
+from bisect import bisect_left
+
+# Bornes des histogrammes de latence, en secondes
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Histogramme à bornes fixes. observe() se limite à une recherche dichotomique
+    et deux additions ; le cumul par borne n'est calculé qu'à l'export.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class UpstreamMetrics:
+    """Latence et statut des appels à Chartmetric, par endpoint (chemin avec paramètres génériques)."""
+
+    def __init__(self):
+        self.latency = {}
+        self.responses = {}
+
+    def observe(self, endpoint, status, seconds):
+        histogram = self.latency.get(endpoint)
+        if histogram is None:
+            histogram = self.latency[endpoint] = Histogram()
+        histogram.observe(seconds)
+        key = (endpoint, status)
+        self.responses[key] = self.responses.get(key, 0) + 1
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class PrometheusWriter:
+    """Construit une exposition au format texte Prometheus (version 0.0.4)."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.lines = []
+
+    def metric(self, name, kind, help_text, samples):
+        """
+        Args:
+            name (str): Nom de la métrique
+            kind (str): counter ou gauge
+            samples (list): Couples (labels, valeur)
+        """
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {value}")
+
+    def histogram(self, name, help_text, histograms):
+        """
+        Args:
+            histograms (list): Couples (labels, Histogram)
+        """
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, histogram in histograms:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                self.lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            cumulative += histogram.counts[-1]
+            self.lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {cumulative}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+            self.lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
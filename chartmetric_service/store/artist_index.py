@@ -0,0 +1,161 @@
+import logging
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Au-delà, les entrées négatives expirées sont purgées à chaque ajout
+MAX_NEGATIVE_ENTRIES = 10000
+
+def normalize_name(name):
+    """Clé de recherche d'un artiste : sans accents ni ponctuation, en minuscules, espaces normalisés."""
+    decomposed = unicodedata.normalize("NFKD", str(name).casefold())
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", without_accents).split())
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ArtistNameIndex:
+    """
+    Index local nom -> artistes Chartmetric, alimenté par chaque réponse /artist/search.
+
+    Seul un nom déjà vu à l'identique (après normalisation) est résolu sans
+    appel réseau, tant que son entrée n'a pas expiré (positive_ttl). Les
+    recherches sans résultat sont mémorisées (entrées négatives) pendant
+    negative_ttl secondes pour ne pas interroger Chartmetric à chaque fois.
+
+    La similarité de trigrammes ne sert qu'à proposer des suggestions : un nom
+    proche ("The Kills" / "The Killers") n'est jamais le même artiste à coup sûr.
+    """
+
+    def __init__(self, negative_ttl=6 * 3600, fuzzy_threshold=0.55, positive_ttl=7 * 86400):
+        """
+        Args:
+            negative_ttl (int): Durée de vie d'une entrée négative en secondes
+            fuzzy_threshold (float): Similarité de trigrammes (Jaccard) minimale pour une suggestion
+            positive_ttl (int): Durée de vie d'une entrée positive en secondes
+        """
+        self.negative_ttl = negative_ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        self.positive_ttl = positive_ttl
+        # nom normalisé -> {ID artiste: fiche renvoyée par la recherche}
+        self.names = {}
+        self._expires = {}
+        self._trigrams = {}
+        self._postings = defaultdict(set)
+        self._negative = {}
+        self.stats = {"exact_hits": 0, "negative_hits": 0, "misses": 0, "suggestions": 0}
+
+    def add(self, artists):
+        """Indexe les artistes d'une réponse de recherche (fiches avec "id" et "name")."""
+        expires_at = time.monotonic() + self.positive_ttl
+        for artist in artists:
+            if not isinstance(artist, dict) or artist.get("id") is None or not artist.get("name"):
+                continue
+            key = normalize_name(artist["name"])
+            if not key:
+                continue
+            if key in self.names and self._expires[key] <= time.monotonic():
+                self._remove(key)
+            if key not in self.names:
+                self.names[key] = {}
+                self._trigrams[key] = trigrams(key)
+                for trigram in self._trigrams[key]:
+                    self._postings[trigram].add(key)
+            self.names[key][artist["id"]] = artist
+            self._expires[key] = expires_at
+            self._negative.pop(key, None)
+
+    def _remove(self, key):
+        del self.names[key]
+        del self._expires[key]
+        for trigram in self._trigrams.pop(key):
+            postings = self._postings[trigram]
+            postings.discard(key)
+            if not postings:
+                del self._postings[trigram]
+
+    def add_negative(self, name):
+        """Mémorise qu'une recherche n'a donné aucun résultat."""
+        self._negative[normalize_name(name)] = time.monotonic() + self.negative_ttl
+        if len(self._negative) > MAX_NEGATIVE_ENTRIES:
+            self.purge_expired()
+
+    def resolve(self, name):
+        """
+        Résout un nom localement, uniquement à l'identique ou par une entrée négative.
+
+        Returns:
+            list | None: Artistes correspondants (liste vide pour une entrée négative),
+                         ou None si Chartmetric doit être interrogé
+        """
+        key = normalize_name(name)
+        if key in self.names:
+            if self._expires[key] > time.monotonic():
+                self.stats["exact_hits"] += 1
+                return list(self.names[key].values())
+            self._remove(key)
+
+        expires_at = self._negative.get(key)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self.stats["negative_hits"] += 1
+                return []
+            del self._negative[key]
+
+        self.stats["misses"] += 1
+        return None
+
+    def suggest(self, name, limit=5):
+        """
+        Artistes indexés dont le nom ressemble à name (similarité de trigrammes),
+        du plus proche au moins proche. À présenter comme suggestions, jamais
+        comme résultat d'une recherche.
+        """
+        now = time.monotonic()
+        suggestions = []
+        for key in self.fuzzy_matches(normalize_name(name), limit):
+            if self._expires[key] > now:
+                suggestions.extend(self.names[key].values())
+        self.stats["suggestions"] += 1
+        return suggestions[:limit]
+
+    def fuzzy_matches(self, key, limit=5):
+        """
+        Noms indexés les plus proches de key selon la similarité de Jaccard des
+        trigrammes, au-dessus du seuil, du plus proche au moins proche.
+        """
+        query = trigrams(key)
+        if not query:
+            return []
+        shared = Counter()
+        for trigram in query:
+            shared.update(self._postings.get(trigram, ()))
+        scored = []
+        for candidate, count in shared.most_common():
+            # Borne supérieure du score : les suivants partagent encore moins de trigrammes
+            if count / len(query) < self.fuzzy_threshold:
+                break
+            score = count / (len(query) + len(self._trigrams[candidate]) - count)
+            if score >= self.fuzzy_threshold:
+                scored.append((score, candidate))
+        scored.sort(key=lambda item: -item[0])
+        return [candidate for _, candidate in scored[:limit]]
+
+    def purge_expired(self):
+        now = time.monotonic()
+        for key in [key for key, expires_at in self._negative.items() if expires_at <= now]:
+            del self._negative[key]
+        for key in [key for key, expires_at in self._expires.items() if expires_at <= now]:
+            self._remove(key)
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            "names": len(self.names),
+            "negative": len(self._negative)
+        }
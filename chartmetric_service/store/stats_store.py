@@ -0,0 +1,314 @@
+import datetime
+import fcntl
+import logging
+import os
+from contextlib import contextmanager
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Clé composite d'un relevé : (ID artiste << 32) | jour depuis l'epoch. Trier les
+# clés trie par artiste puis par date : l'historique d'un artiste est une tranche contiguë
+ARTIST_SHIFT = 32
+DAY_MASK = (1 << ARTIST_SHIFT) - 1
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+def to_day(timestamp):
+    """Convertit un horodatage Chartmetric ("2025-01-31T00:00:00.000Z") ou epoch en jour depuis l'epoch."""
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp // 86400)
+    return datetime.date.fromisoformat(str(timestamp)[:10]).toordinal() - EPOCH_ORDINAL
+
+def from_day(day):
+    return datetime.date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
+
+def artist_keys(artist_ids, days=0):
+    return (np.asarray(artist_ids, dtype=np.int64) << ARTIST_SHIFT) | np.asarray(days, dtype=np.int64)
+
+def merge_readings(keys, values, new_keys, new_values):
+    """
+    Fusionne deux ensembles de relevés en colonnes triées et sans doublon ;
+    pour une même clé, le relevé de new_keys/new_values l'emporte.
+    """
+    keys = np.concatenate([keys, new_keys])
+    values = np.concatenate([values, new_values])
+    # Tri stable : pour une clé en double, le relevé le plus récent reste en dernier
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    keep = np.ones(len(keys), dtype=bool)
+    keep[:-1] = keys[1:] != keys[:-1]
+    return keys[keep], values[keep]
+
+class Series:
+    """
+    Une métrique (ex. spotify.followers) pour tous les artistes, en deux colonnes
+    triées : clés composites (int64) et valeurs (float64).
+
+    Les nouveaux relevés s'accumulent dans un tampon et sont fusionnés à la
+    prochaine lecture ; pour un même artiste et un même jour, le dernier relevé l'emporte.
+    Ils sont aussi conservés jusqu'à la prochaine sauvegarde, qui les fusionne
+    avec les fichiers sur disque.
+    """
+
+    def __init__(self, keys=None, values=None):
+        self.keys = keys if keys is not None else np.empty(0, dtype=np.int64)
+        self.values = values if values is not None else np.empty(0, dtype=np.float64)
+        self._pending_keys = []
+        self._pending_values = []
+        # Relevés reçus depuis la dernière sauvegarde
+        self._unsaved_keys = []
+        self._unsaved_values = []
+
+    @property
+    def unsaved(self):
+        return bool(self._unsaved_keys)
+
+    def append(self, artist_id, days, values):
+        keys = [int(key) for key in artist_keys(artist_id, days)]
+        self._pending_keys.extend(keys)
+        self._pending_values.extend(values)
+        self._unsaved_keys.extend(keys)
+        self._unsaved_values.extend(values)
+
+    def take_unsaved(self):
+        """Renvoie les relevés reçus depuis la dernière sauvegarde (clés, valeurs) et les oublie."""
+        keys = np.array(self._unsaved_keys, dtype=np.int64)
+        values = np.array(self._unsaved_values, dtype=np.float64)
+        self._unsaved_keys, self._unsaved_values = [], []
+        return keys, values
+
+    def restore_unsaved(self, keys, values):
+        """Remet en attente de sauvegarde des relevés dont l'écriture a échoué."""
+        self._unsaved_keys[:0] = keys.tolist()
+        self._unsaved_values[:0] = values.tolist()
+
+    def consolidate(self):
+        if not self._pending_keys:
+            return
+        pending_keys = np.array(self._pending_keys, dtype=np.int64)
+        pending_values = np.array(self._pending_values, dtype=np.float64)
+        self._pending_keys, self._pending_values = [], []
+        self.keys, self.values = merge_readings(self.keys, self.values, pending_keys, pending_values)
+
+    def bounds(self, artist_ids, start_day=0, end_day=DAY_MASK):
+        """Indices [lo, hi) des relevés de chaque artiste entre start_day et end_day inclus."""
+        self.consolidate()
+        lo = np.searchsorted(self.keys, artist_keys(artist_ids, start_day), side="left")
+        hi = np.searchsorted(self.keys, artist_keys(artist_ids, end_day), side="right")
+        return lo, hi
+
+class StatsStore:
+    """
+    Historique des statistiques d'artistes au format colonnes, une série par
+    source et métrique ("spotify.followers", "youtube_channel.views"...).
+
+    Les séries sont persistées en fichiers .npy et rechargées en mmap ; les
+    requêtes (plages, croissance, moyennes mobiles) portent sur plusieurs
+    artistes à la fois et sont vectorisées avec NumPy.
+
+    Plusieurs workers partagent le même répertoire : chaque sauvegarde prend un
+    verrou exclusif, relit les fichiers et n'y fusionne que les relevés reçus
+    par ce worker depuis sa dernière sauvegarde. Aucun worker n'écrase donc
+    l'historique des autres ; chacun ne voit en mémoire que ce qu'il a chargé
+    au démarrage et ce qu'il a lui-même reçu.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.series = {}
+
+    def ingest(self, artist_id, source, stats):
+        """
+        Ajoute une réponse /artist/{id}/stat/{source} de Chartmetric à l'historique.
+
+        Args:
+            artist_id (int): ID Chartmetric de l'artiste
+            source (str): Plateforme (spotify, youtube_channel...)
+            stats (dict): Métrique -> liste de relevés {"timestp", "value"}
+
+        Returns:
+            int: Nombre de relevés ajoutés
+        """
+        added = 0
+        for metric, points in (stats or {}).items():
+            if not isinstance(points, list):
+                continue
+            days, values = [], []
+            for point in points:
+                if not isinstance(point, dict) or point.get("timestp") is None:
+                    continue
+                value = point.get("value")
+                if not isinstance(value, (int, float)):
+                    continue
+                try:
+                    days.append(to_day(point["timestp"]))
+                except ValueError:
+                    continue
+                values.append(float(value))
+            if days:
+                self.series.setdefault(f"{source}.{metric}", Series()).append(artist_id, days, values)
+                added += len(days)
+        return added
+
+    def _series(self, source, metric):
+        series = self.series.get(f"{source}.{metric}")
+        if series is None:
+            raise KeyError(f"Aucun historique pour {source}.{metric}")
+        return series
+
+    def history(self, artist_ids, source, metric, start=None, end=None):
+        """
+        Relevés de chaque artiste sur une plage de dates (bornes incluses, format AAAA-MM-JJ).
+
+        Returns:
+            dict: ID artiste -> (jours, valeurs), deux tableaux NumPy
+        """
+        series = self._series(source, metric)
+        start_day = to_day(start) if start else 0
+        end_day = to_day(end) if end else DAY_MASK
+        lo, hi = series.bounds(artist_ids, start_day, end_day)
+        return {
+            artist_id: (series.keys[l:h] & DAY_MASK, series.values[l:h])
+            for artist_id, l, h in zip(artist_ids, lo, hi)
+        }
+
+    def growth(self, artist_ids, source, metric, days=30):
+        """
+        Croissance de chaque artiste sur les `days` derniers jours de son historique.
+
+        La valeur de référence est le dernier relevé antérieur ou égal au début
+        de la fenêtre (ou le premier relevé si l'historique est plus court).
+
+        Returns:
+            dict: ID artiste -> croissance (valeurs, écart, taux, variation par jour), ou None sans historique
+        """
+        series = self._series(source, metric)
+        ids = np.asarray(artist_ids, dtype=np.int64)
+        lo, hi = series.bounds(ids)
+        has_data = hi > lo
+        last = np.where(has_data, hi - 1, 0)
+        last_day = series.keys[last] & DAY_MASK if len(series.keys) else np.zeros(len(ids), dtype=np.int64)
+        base = np.searchsorted(series.keys, artist_keys(ids, np.maximum(last_day - days, 0)), side="right") - 1
+        base = np.where(has_data, np.maximum(base, lo), 0)
+
+        end_values = series.values[last] if len(series.values) else np.zeros(len(ids))
+        start_values = series.values[base] if len(series.values) else np.zeros(len(ids))
+        span = (last_day - (series.keys[base] & DAY_MASK)) if len(series.keys) else np.zeros(len(ids), dtype=np.int64)
+        delta = end_values - start_values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(start_values > 0, delta / start_values, np.nan)
+            per_day = np.where(span > 0, delta / span, np.nan)
+
+        result = {}
+        for i, artist_id in enumerate(artist_ids):
+            if not has_data[i]:
+                result[artist_id] = None
+                continue
+            result[artist_id] = {
+                "from": from_day(last_day[i] - span[i]),
+                "to": from_day(last_day[i]),
+                "start_value": float(start_values[i]),
+                "end_value": float(end_values[i]),
+                "delta": float(delta[i]),
+                "growth_rate": None if np.isnan(rate[i]) else float(rate[i]),
+                "per_day": None if np.isnan(per_day[i]) else float(per_day[i])
+            }
+        return result
+
+    def moving_average(self, artist_ids, source, metric, window=7, start=None, end=None):
+        """
+        Moyenne mobile de chaque artiste sur ses `window` derniers relevés, calculée
+        en une passe (somme cumulée) sur les historiques de tous les artistes demandés.
+
+        Returns:
+            dict: ID artiste -> (jours, moyennes), deux tableaux NumPy
+        """
+        series = self._series(source, metric)
+        start_day = to_day(start) if start else 0
+        end_day = to_day(end) if end else DAY_MASK
+        lo, hi = series.bounds(artist_ids, start_day, end_day)
+        lengths = hi - lo
+        segment_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        # Indices de tous les relevés sélectionnés, mis bout à bout
+        positions = np.arange(lengths.sum())
+        indices = positions + np.repeat(lo - segment_starts, lengths)
+        values = series.values[indices]
+
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        window_starts = np.maximum(np.repeat(segment_starts, lengths), positions - window + 1)
+        averages = (cumulative[positions + 1] - cumulative[window_starts]) / (positions + 1 - window_starts)
+
+        days = series.keys[indices] & DAY_MASK
+        split_at = np.cumsum(lengths)[:-1]
+        return {
+            artist_id: (artist_days, artist_averages)
+            for artist_id, artist_days, artist_averages in zip(artist_ids, np.split(days, split_at), np.split(averages, split_at))
+        }
+
+    @contextmanager
+    def _locked(self, mode):
+        """Verrou (fcntl) sur le répertoire, partagé par tous les workers : LOCK_SH en lecture, LOCK_EX en écriture."""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, mode)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_series(self, name, mmap_mode=None):
+        keys_path = os.path.join(self.directory, name, "keys.npy")
+        values_path = os.path.join(self.directory, name, "values.npy")
+        if not (os.path.exists(keys_path) and os.path.exists(values_path)):
+            return None
+        return np.load(keys_path, mmap_mode=mmap_mode), np.load(values_path, mmap_mode=mmap_mode)
+
+    def load(self):
+        """Charge les séries persistées (en mmap, lecture seule jusqu'à la prochaine fusion)."""
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        with self._locked(fcntl.LOCK_SH):
+            for name in os.listdir(self.directory):
+                arrays = self._read_series(name, mmap_mode="r")
+                if arrays is not None:
+                    self.series[name] = Series(*arrays)
+        logger.info(f"Historique des statistiques chargé : {len(self.series)} séries depuis {self.directory}")
+
+    def take_unsaved(self):
+        """Renvoie, par série, les relevés reçus depuis la dernière sauvegarde, prêts à être sauvegardés."""
+        return {name: series.take_unsaved() for name, series in self.series.items() if series.unsaved}
+
+    def restore_unsaved(self, readings):
+        """Remet en attente les relevés d'une sauvegarde en échec, pour la sauvegarde suivante."""
+        for name, (keys, values) in readings.items():
+            self.series.setdefault(name, Series()).restore_unsaved(keys, values)
+
+    def save(self, readings):
+        """
+        Fusionne les relevés fournis par take_unsaved() dans les fichiers de chaque
+        série, sous verrou exclusif (fichiers temporaires puis renommage).
+        Peut s'exécuter hors de la boucle d'événements : les tableaux ne sont plus modifiés.
+        """
+        if not self.directory or not readings:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            for name, (new_keys, new_values) in readings.items():
+                series_dir = os.path.join(self.directory, name)
+                os.makedirs(series_dir, exist_ok=True)
+                on_disk = self._read_series(name)
+                if on_disk is None:
+                    keys, values = merge_readings(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), new_keys, new_values)
+                else:
+                    keys, values = merge_readings(on_disk[0], on_disk[1], new_keys, new_values)
+                for filename, array in (("keys.npy", keys), ("values.npy", values)):
+                    tmp_path = os.path.join(series_dir, f".{filename}.tmp")
+                    with open(tmp_path, "wb") as f:
+                        np.save(f, array)
+                    os.replace(tmp_path, os.path.join(series_dir, filename))
+        logger.info(f"Historique des statistiques sauvegardé : {len(readings)} séries")
+
+    def snapshot(self):
+        return {
+            "series": len(self.series),
+            "points": sum(len(series.keys) + len(series._pending_keys) for series in self.series.values())
+        }
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+class QueueFullError(Exception):
+    """La file d'attente des générations est pleine."""
+
+
+class GenerationQueue:
+    """
+    Limite le nombre de générations OpenAI simultanées.
+
+    Au plus max_in_flight générations s'exécutent en même temps ; les
+    suivantes attendent leur tour dans une file bornée à max_queued. Au-delà,
+    la demande est refusée immédiatement (QueueFullError) plutôt que de faire
+    attendre le client jusqu'à son propre timeout.
+    """
+
+    def __init__(self, max_in_flight=4, max_queued=16, latency_window=500):
+        """
+        Args:
+            max_in_flight (int): Générations exécutées en parallèle
+            max_queued (int): Générations en attente au-delà desquelles les demandes sont refusées
+            latency_window (int): Nombre de dernières générations utilisées pour les percentiles
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        # Créé dans la boucle qui sert les requêtes (voir _get_semaphore) : avant Python 3.10,
+        # un Semaphore créé à l'import serait rattaché à une autre boucle
+        self._semaphore = None
+        self.in_flight = 0
+        self.queued = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._waits = deque(maxlen=latency_window)
+        self.stats = {"completed": 0, "failed": 0, "rejected": 0}
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphore
+
+    def full(self):
+        """Indique si une nouvelle demande serait refusée."""
+        return self.queued >= self.max_queued and self.in_flight >= self.max_in_flight
+
+    def check_capacity(self):
+        """
+        Refuse la demande (et la compte comme rejetée) si la file est pleine.
+
+        Raises:
+            QueueFullError: Si la file d'attente est pleine
+        """
+        if self.full():
+            self.stats["rejected"] += 1
+            raise QueueFullError(f"File de génération pleine ({self.queued} en attente)")
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Réserve une place de génération pour la durée du bloc (ex. un flux SSE).
+
+        Raises:
+            QueueFullError: Si la file d'attente est pleine
+        """
+        self.check_capacity()
+        semaphore = self._get_semaphore()
+        self.queued += 1
+        enqueued_at = time.perf_counter()
+        try:
+            await semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self._waits.append(started_at - enqueued_at)
+        self.in_flight += 1
+        try:
+            yield
+            self.stats["completed"] += 1
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+            self._latencies.append(time.perf_counter() - started_at)
+
+    async def run(self, factory):
+        """
+        Exécute une génération dès qu'une place se libère.
+
+        Args:
+            factory (callable): Fonction sans argument renvoyant la coroutine à exécuter
+
+        Raises:
+            QueueFullError: Si la file d'attente est pleine
+        """
+        async with self.slot():
+            return await factory()
+
+    def retry_after(self):
+        """Estimation du délai avant qu'une place se libère, en secondes (en-tête Retry-After)."""
+        median = _percentile(sorted(self._latencies), 50) or 1.0
+        return max(1, round(median * (self.queued + 1) / self.max_in_flight))
+
+    def snapshot(self):
+        latencies = sorted(self._latencies)
+        waits = sorted(self._waits)
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_in_flight": self.max_in_flight,
+            "max_queued": self.max_queued,
+            "latency_ms": {f"p{p}": _to_ms(_percentile(latencies, p)) for p in (50, 95, 99)},
+            "queue_wait_ms": {f"p{p}": _to_ms(_percentile(waits, p)) for p in (50, 95, 99)}
+        }
+
+
+def _percentile(values, percentile):
+    """Percentile (rang le plus proche) d'une liste triée, None si elle est vide."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, round(percentile / 100 * len(values)) - 1))
+    return values[index]
+
+
+def _to_ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
@@ -0,0 +1,140 @@
+"""
+Analyse incrémentale des réponses JSON du modèle.
+
+Copie à l'identique de campaign_analyst/json_stream.py : chaque service est
+construit comme une image indépendante à partir de son propre répertoire et ne
+peut pas importer de code extérieur. Toute correction doit être reportée dans
+les deux copies.
+"""
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Analyse incrémentale d'un objet JSON reçu par morceaux (flux OpenAI).
+
+    Chaque clé de premier niveau est émise dès que sa valeur est complète,
+    sans attendre la fin de l'objet. Le texte qui précède la première
+    accolade (par exemple une balise ```json) est ignoré.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._state = "key"
+        self._value_kind = None
+        self._token_start = None
+        self._key = None
+        self.done = False
+        self.result = {}
+
+    @property
+    def text(self):
+        """Texte brut reçu jusqu'ici."""
+        return self._text
+
+    def feed(self, chunk):
+        """
+        Ajoute un morceau de texte au tampon.
+
+        Args:
+            chunk (str): Morceau de texte reçu
+
+        Returns:
+            list: Paires (clé, valeur) complétées par ce morceau
+
+        Raises:
+            ValueError: Si une valeur complète n'est pas du JSON valide
+        """
+        self._text += chunk
+        text = self._text
+        completed = []
+        while self._pos < len(text) and not self.done:
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key_string":
+                        self._key = json.loads(text[self._token_start:i + 1])
+                        self._state = "colon"
+                    elif self._depth == 1 and self._state == "value" and self._value_kind == "string":
+                        completed.append(self._emit(text[self._token_start:i + 1]))
+                continue
+
+            if not self._started:
+                if c == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._state == "key":
+                    self._state = "key_string"
+                    self._token_start = i
+                elif self._depth == 1 and self._state == "value_start":
+                    self._start_value("string", i)
+            elif c in "{[":
+                if self._depth == 1 and self._state == "value_start":
+                    self._start_value("container", i)
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._state == "value" and self._value_kind == "container":
+                    completed.append(self._emit(text[self._token_start:i + 1]))
+                elif self._depth == 0:
+                    if self._state == "value" and self._value_kind == "scalar":
+                        completed.append(self._emit(text[self._token_start:i]))
+                    self.done = True
+            elif self._depth == 1:
+                if c == ":" and self._state == "colon":
+                    self._state = "value_start"
+                elif c == ",":
+                    if self._state == "value" and self._value_kind == "scalar":
+                        completed.append(self._emit(text[self._token_start:i]))
+                    self._state = "key"
+                elif not c.isspace() and self._state == "value_start":
+                    self._start_value("scalar", i)
+        return completed
+
+    def _start_value(self, kind, index):
+        self._state = "value"
+        self._value_kind = kind
+        self._token_start = index
+
+    def _emit(self, raw):
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Valeur JSON invalide pour la clé {self._key}: {str(e)}")
+        self.result[self._key] = value
+        self._state = "after_value"
+        return self._key, value
+
+
+def parse_json_response(text):
+    """
+    Parse une réponse complète du modèle, avec ou sans balises ```json.
+
+    Raises:
+        ValueError: Si aucun objet JSON valide n'est trouvé
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("Aucun objet JSON dans la réponse")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Réponse JSON invalide : {str(e)}")
@@ -1,13 +1,15 @@
-from flask import Flask, request, jsonify
+from quart import Quart, request, jsonify
 import os
 from dotenv import load_dotenv
 from cachetools import TTLCache
 import logging
 import json
 import re
-import requests
+import aiohttp
+from generation_queue import GenerationQueue, QueueFullError
+from json_stream import IncrementalJSONParser, parse_json_response
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 # Configuration des logs
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,13 +22,43 @@ if not openai_api_key:
     logger.critical("OPENAI_API_KEY manquant")
     raise ValueError("OPENAI_API_KEY manquant")
 
+# OPENAI_BASE_URL permet de cibler un serveur compatible local (voir campaign_analyst/openai_stub.py)
+OPENAI_BASE_URL = (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
 # Cache avec TTL de 24h
 cache = TTLCache(maxsize=100, ttl=86400)
 
+# Générations OpenAI simultanées et en attente ; au-delà, les demandes reçoivent un 503
+generation_queue = GenerationQueue(
+    max_in_flight=int(os.getenv("MARKETING_MAX_IN_FLIGHT", "4")),
+    max_queued=int(os.getenv("MARKETING_MAX_QUEUED", "16"))
+)
+
+# Session HTTP partagée, créée au démarrage du service (voir startup)
+http_session = None
+
+class GenerationError(Exception):
+    """Échec de la génération, avec le message renvoyé au client."""
+
+@app.before_serving
+async def startup():
+    global http_session
+    connector = aiohttp.TCPConnector(limit=generation_queue.max_in_flight * 2, keepalive_timeout=60)
+    http_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=OPENAI_TIMEOUT))
+
+@app.after_serving
+async def shutdown():
+    await http_session.close()
+
 # Endpoint de test pour vérifier que le serveur est accessible
 @app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "healthy", "message": "Marketing Agent is running"}), 200
+async def health_check():
+    return jsonify({
+        "status": "healthy",
+        "message": "Marketing Agent is running",
+        "generation": generation_queue.snapshot()
+    }), 200
 
 def clean_description(description):
     generic_phrases = [
@@ -73,10 +105,132 @@ def validate_data(data):
 
     return data
 
+# Sections de la réponse, dans l'ordre demandé au modèle
+REQUIRED_SECTIONS = ["short_titles", "long_titles", "long_descriptions", "youtube_description_short", "youtube_description_full", "analysis"]
+# Sections devant contenir exactement 5 éléments
+COUNTED_SECTIONS = ["short_titles", "long_titles", "long_descriptions"]
+
+def openai_request(prompt, stream=False):
+    """En-têtes et corps d'un appel à l'API OpenAI (chat completions)."""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {openai_api_key}"
+    }
+    payload = {
+        "model": "gpt-4o",
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": 2000,
+        "temperature": 0.7,
+        "stream": stream
+    }
+    return headers, payload
+
+async def request_completion(session, prompt):
+    """Appelle l'API OpenAI et renvoie le texte généré."""
+    headers, payload = openai_request(prompt)
+    try:
+        logger.info("Appel à l'API OpenAI...")
+        async with session.post(f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload) as response:
+            if response.status != 200:
+                logger.error(f"Erreur API OpenAI: {response.status} - {await response.text()}")
+                raise GenerationError(f"Erreur API OpenAI: {response.status}")
+            response_data = await response.json()
+    except GenerationError:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur lors de l'appel à l'API OpenAI : {str(e)}")
+        raise GenerationError(f"Erreur lors de l'appel à l'API OpenAI : {str(e)}")
+    logger.info("Réponse OpenAI reçue avec succès")
+    return response_data['choices'][0]['message']['content']
+
+async def stream_completion(session, prompt):
+    """Appelle l'API OpenAI en streaming et émet le texte généré au fil de l'eau."""
+    headers, payload = openai_request(prompt, stream=True)
+    try:
+        logger.info("Appel à l'API OpenAI (streaming)...")
+        async with session.post(f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload) as response:
+            if response.status != 200:
+                logger.error(f"Erreur API OpenAI: {response.status} - {await response.text()}")
+                raise GenerationError(f"Erreur API OpenAI: {response.status}")
+            async for line in response.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                choices = json.loads(data).get("choices")
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    yield delta
+    except GenerationError:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur lors de l'appel à l'API OpenAI : {str(e)}")
+        raise GenerationError(f"Erreur lors de l'appel à l'API OpenAI : {str(e)}")
+
+def check_section(key, value):
+    """Vérifie une section de la réponse et renvoie sa version nettoyée."""
+    # Vérification du nombre d'éléments
+    if key in COUNTED_SECTIONS and (not isinstance(value, list) or len(value) != 5):
+        count = len(value) if isinstance(value, list) else 0
+        logger.error(f"Nombre incorrect de {key} : {count}")
+        raise GenerationError(f"Nombre incorrect de {key}")
+
+    # Nettoyer la description YouTube pour éviter les phrases génériques
+    if key == "youtube_description_full":
+        description = clean_description(value["description"])
+        value = {**value, "description": description, "character_count": len(description)}
+    return value
+
+def parse_generation(result):
+    """Valide la réponse du modèle et renvoie le contenu publicitaire nettoyé."""
+    # Nettoyer la réponse pour enlever les balises ```json ... ```
+    result_cleaned = re.sub(r'^```json\n|\n```$', '', result).strip()
+
+    # Vérification que la réponse est un JSON valide
+    try:
+        result_json = json.loads(result_cleaned)
+    except json.JSONDecodeError:
+        logger.error(f"Réponse OpenAI non-JSON après nettoyage : {result_cleaned}")
+        raise GenerationError("La génération a échoué : réponse non-JSON")
+
+    # Vérification des clés attendues
+    missing_keys = [key for key in REQUIRED_SECTIONS if key not in result_json]
+    if missing_keys:
+        logger.error(f"Clés manquantes dans la réponse JSON : {missing_keys}")
+        raise GenerationError(f"Clés manquantes dans la réponse : {missing_keys}")
+
+    for key in REQUIRED_SECTIONS:
+        result_json[key] = check_section(key, result_json[key])
+    return result_json
+
+def cache_key_for(data):
+    cache_key = "_".join([str(data.get(field, '')) for field in ['artist', 'genres', 'language', 'promotion_type', 'song', 'tone']])
+    logger.info(f"Clé de cache : {cache_key}")
+    return cache_key
+
+def cached_generation(cache_key):
+    """Renvoie le contenu en cache pour cette clé, ou None ; les entrées corrompues sont supprimées."""
+    if cache_key not in cache:
+        return None
+    logger.info(f"Réponse trouvée dans le cache pour : {cache_key}")
+    cached_result = cache[cache_key]
+    if not cached_result or "short_titles" not in cached_result:
+        logger.warning(f"Données en cache vides ou corrompues pour : {cache_key}")
+        cache.pop(cache_key)
+        return None
+    return cached_result
+
+async def generate_content(data):
+    prompt = generate_prompt(data)
+    logger.info("Prompt généré avec succès")
+    return parse_generation(await request_completion(http_session, prompt))
+
 @app.route('/generate_ads', methods=['POST'])
-def generate_ads():
+async def generate_ads():
     try:
-        data = request.get_json()
+        data = await request.get_json()
         if not data:
             logger.error("Aucune donnée JSON fournie")
             return jsonify({"error": "Aucune donnée fournie"}), 400
@@ -91,90 +245,20 @@ def generate_ads():
             logger.error(f"Erreur de validation des données : {str(e)}")
             return jsonify({"error": f"Erreur de validation des données : {str(e)}"}), 400
 
-        # Clé de cache
-        cache_key = "_".join([str(data.get(field, '')) for field in ['artist', 'genres', 'language', 'promotion_type', 'song', 'tone']])
-        logger.info(f"Clé de cache : {cache_key}")
-
         # Vérification du cache
-        if cache_key in cache:
-            logger.info(f"Réponse trouvée dans le cache pour : {cache_key}")
-            cached_result = cache[cache_key]
-            if not cached_result or "short_titles" not in cached_result:
-                logger.warning(f"Données en cache vides ou corrompues pour : {cache_key}")
-                cache.pop(cache_key)
-            else:
-                return jsonify(cached_result)
-
-        # Génération du prompt
-        prompt = generate_prompt(data)
-        logger.info("Prompt généré avec succès")
-
-        # Appel direct à l'API OpenAI via requests
-        try:
-            logger.info("Appel à l'API OpenAI via requests...")
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {openai_api_key}"
-            }
-            
-            payload = {
-                "model": "gpt-4o",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 2000,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=payload,
-                timeout=60
-            ) 
-            
-            if response.status_code != 200:
-                logger.error(f"Erreur API OpenAI: {response.status_code} - {response.text}")
-                return jsonify({"error": f"Erreur API OpenAI: {response.status_code}"}), 500
-                
-            response_data = response.json()
-            result = response_data['choices'][0]['message']['content']
-            logger.info("Réponse OpenAI reçue avec succès")
-            
-        except Exception as e:
-            logger.error(f"Erreur lors de l'appel à l'API OpenAI : {str(e)}")
-            return jsonify({"error": f"Erreur lors de l'appel à l'API OpenAI : {str(e)}"}), 500
+        cache_key = cache_key_for(data)
+        cached_result = cached_generation(cache_key)
+        if cached_result is not None:
+            return jsonify(cached_result)
 
-        # Nettoyer la réponse pour enlever les balises ```json ... ```
-        result_cleaned = re.sub(r'^```json\n|\n```$', '', result).strip()
-
-        # Vérification que la réponse est un JSON valide
+        # Génération dans la limite des places disponibles
         try:
-            result_json = json.loads(result_cleaned)
-        except json.JSONDecodeError as e:
-            logger.error(f"Réponse OpenAI non-JSON après nettoyage : {result_cleaned}")
-            return jsonify({"error": "La génération a échoué : réponse non-JSON"}), 500
-
-        # Vérification des clés attendues
-        required_keys = ["short_titles", "long_titles", "long_descriptions", "youtube_description_short", "youtube_description_full", "analysis"]
-        missing_keys = [key for key in required_keys if key not in result_json]
-        if missing_keys:
-            logger.error(f"Clés manquantes dans la réponse JSON : {missing_keys}")
-            return jsonify({"error": f"Clés manquantes dans la réponse : {missing_keys}"}), 500
-
-        # Vérification du nombre d'éléments
-        if len(result_json["short_titles"]) != 5:
-            logger.error(f"Nombre incorrect de short_titles : {len(result_json['short_titles'])}")
-            return jsonify({"error": "Nombre incorrect de short_titles"}), 500
-        if len(result_json["long_titles"]) != 5:
-            logger.error(f"Nombre incorrect de long_titles : {len(result_json['long_titles'])}")
-            return jsonify({"error": "Nombre incorrect de long_titles"}), 500
-        if len(result_json["long_descriptions"]) != 5:
-            logger.error(f"Nombre incorrect de long_descriptions : {len(result_json['long_descriptions'])}")
-            return jsonify({"error": "Nombre incorrect de long_descriptions"}), 500
-
-        # Nettoyer la description YouTube pour éviter les phrases génériques
-        result_json["youtube_description_full"]["description"] = clean_description(result_json["youtube_description_full"]["description"])
-        result_json["youtube_description_full"]["character_count"] = len(result_json["youtube_description_full"]["description"])
+            result_json = await generation_queue.run(lambda: generate_content(data))
+        except QueueFullError as e:
+            logger.warning(str(e))
+            return jsonify({"error": "Service saturé, réessayez plus tard"}), 503, {"Retry-After": str(generation_queue.retry_after())}
+        except GenerationError as e:
+            return jsonify({"error": str(e)}), 500
 
         # Mise en cache et réponse
         cache[cache_key] = result_json
@@ -185,6 +269,109 @@ def generate_ads():
         logger.error(f"Erreur inattendue : {str(e)}")
         return jsonify({"error": f"Erreur interne : {str(e)}"}), 500
 
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+async def stream_sections(data):
+    """
+    Génère le contenu en streaming et émet chaque section dès qu'elle est
+    complète et vérifiée, sous forme de couples (clé, valeur).
+    """
+    prompt = generate_prompt(data)
+    logger.info("Prompt généré avec succès")
+    parser = IncrementalJSONParser()
+    emitted = {}
+    try:
+        async for delta in stream_completion(http_session, prompt):
+            for key, value in parser.feed(delta):
+                if key in REQUIRED_SECTIONS and key not in emitted:
+                    emitted[key] = check_section(key, value)
+                    yield key, emitted[key]
+            if parser.done:
+                break
+    except ValueError as e:
+        logger.error(f"Réponse OpenAI mal formée : {str(e)}")
+        raise GenerationError("La génération a échoué : réponse non-JSON")
+
+    # Réponse tronquée ou mal formée : dernière tentative sur le texte complet
+    if not parser.done:
+        try:
+            result_json = parse_json_response(parser.text)
+        except ValueError:
+            logger.error(f"Réponse OpenAI non-JSON : {parser.text}")
+            raise GenerationError("La génération a échoué : réponse non-JSON")
+        for key in REQUIRED_SECTIONS:
+            if key in result_json and key not in emitted:
+                emitted[key] = check_section(key, result_json[key])
+                yield key, emitted[key]
+
+    missing_keys = [key for key in REQUIRED_SECTIONS if key not in emitted]
+    if missing_keys:
+        logger.error(f"Clés manquantes dans la réponse JSON : {missing_keys}")
+        raise GenerationError(f"Clés manquantes dans la réponse : {missing_keys}")
+
+@app.route('/generate_ads/stream', methods=['POST'])
+async def generate_ads_stream():
+    """
+    Variante en streaming de /generate_ads (Server-Sent Events).
+
+    Émet un événement par section (short_titles, long_titles,
+    long_descriptions, youtube_description_short, youtube_description_full,
+    analysis) dès qu'elle est complète, puis un événement "complete" contenant
+    le résultat entier, ou "error" en cas d'échec.
+    """
+    data = await request.get_json()
+    if not data:
+        logger.error("Aucune donnée JSON fournie")
+        return jsonify({"error": "Aucune donnée fournie"}), 400
+
+    try:
+        data = validate_data(data)
+    except Exception as e:
+        logger.error(f"Erreur de validation des données : {str(e)}")
+        return jsonify({"error": f"Erreur de validation des données : {str(e)}"}), 400
+
+    cache_key = cache_key_for(data)
+    cached_result = cached_generation(cache_key)
+    # Refus immédiat si la file est pleine, avant d'ouvrir le flux
+    try:
+        if cached_result is None:
+            generation_queue.check_capacity()
+    except QueueFullError as e:
+        logger.warning(f"{str(e)}, flux refusé")
+        return jsonify({"error": "Service saturé, réessayez plus tard"}), 503, {"Retry-After": str(generation_queue.retry_after())}
+
+    async def events():
+        if cached_result is not None:
+            for key in REQUIRED_SECTIONS:
+                yield sse_event(key, cached_result[key])
+            yield sse_event("complete", cached_result)
+            return
+
+        result_json = {}
+        try:
+            async with generation_queue.slot():
+                async for key, value in stream_sections(data):
+                    result_json[key] = value
+                    yield sse_event(key, value)
+        except QueueFullError as e:
+            logger.warning(str(e))
+            yield sse_event("error", {"error": "Service saturé, réessayez plus tard"})
+            return
+        except GenerationError as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        except Exception as e:
+            logger.error(f"Erreur inattendue : {str(e)}")
+            yield sse_event("error", {"error": f"Erreur interne : {str(e)}"})
+            return
+
+        cache[cache_key] = result_json
+        logger.info(f"Contenu généré et mis en cache pour : {cache_key}")
+        yield sse_event("complete", result_json)
+
+    return events(), 200, {"Content-Type": "text/event-stream", "Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 def generate_prompt(data):
     artist = data.get('artist', 'Artiste Inconnu')
     song = data.get('song', '')